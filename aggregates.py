@@ -0,0 +1,162 @@
+"""Sum/count aggregation cube for the San Francisco census data.
+
+The analysis averages ``sfo_data_df`` by year, by neighborhood and by
+(year, neighborhood). Rather than scanning the raw rows once per
+``groupby().mean()``, the rows are reduced a single time into per-cell sums
+and non-null counts at the (year, neighborhood) grain. Every coarser mean is
+then a rollup of that small cube: ``sum(sums) / sum(counts)`` over the
+cells of each group, which is exactly the mean of the underlying rows.
+
+Rollups that drop the ``year`` key also carry the mean ``year`` column, as
+``sfo_data_df.groupby('neighborhood').mean()`` does; it is derived from the
+row count of each cell.
+
+Because sums and counts add, a cube can also be built out of core: each
+bounded-size batch of rows is reduced to its own small cube and folded into
+a running one (``AggregateCube.from_csv``). Peak memory is then one batch
+plus one cube, whatever the length of the input.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Grain of the cube and the numeric columns that are averaged
+KEYS = ['year', 'neighborhood']
+METRICS = ['sale_price_sqr_foot', 'housing_units', 'gross_rent']
+
+# Columns plotted alongside each other in the price views
+PRICE_COLUMNS = ['sale_price_sqr_foot', 'gross_rent']
+
+# Index order of the rent_to_price view in the data story
+NEIGHBORHOOD_YEAR = ['neighborhood', 'year']
+
+# Rows per batch when streaming a CSV
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def add_rent_to_price(prices):
+    # Gross rent per dollar of sale price per square foot
+    prices['rent_to_price'] = prices['gross_rent'] / prices['sale_price_sqr_foot']
+    return prices
+
+
+class AggregateCube:
+    """Per-(year, neighborhood) sums and non-null counts of the metrics."""
+
+    def __init__(self, sums, counts, sizes):
+        self.sums = sums
+        self.counts = counts
+        # Number of rows that landed in each cell
+        self.sizes = sizes
+
+    @classmethod
+    def empty(cls, metrics=METRICS):
+        index = pd.MultiIndex.from_arrays([[], []], names=KEYS)
+        metrics = list(metrics)
+        return cls(
+            pd.DataFrame(0.0, index=index, columns=metrics),
+            pd.DataFrame(0, index=index, columns=metrics),
+            pd.Series(0, index=index, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_frame(cls, df, metrics=METRICS):
+        # One grouping of the raw rows; sum and count reuse the same group codes.
+        # observed=True keeps categorical neighborhoods to the cells that occur.
+        grouped = df.groupby(KEYS, sort=True, observed=True)[list(metrics)]
+        return cls(grouped.sum(), grouped.count(), grouped.size())
+
+    @classmethod
+    def from_batches(cls, batches, metrics=METRICS):
+        # Fold an iterable of DataFrames into one cube, one batch at a time
+        cube = cls.empty(metrics)
+        for batch in batches:
+            cube.update(batch)
+        return cube
+
+    @classmethod
+    def from_csv(cls, path, chunksize=DEFAULT_CHUNKSIZE, metrics=METRICS):
+        """Stream ``path`` in batches of ``chunksize`` rows into a cube."""
+        reader = pd.read_csv(path, usecols=KEYS + list(metrics), chunksize=chunksize)
+        with reader:
+            return cls.from_batches(reader, metrics)
+
+    def merge(self, other):
+        # Cell-wise sum of two cubes; cells present in only one are kept as is
+        sums = self.sums.add(other.sums, fill_value=0)
+        counts = self.counts.add(other.counts, fill_value=0).astype(np.int64)
+        sizes = self.sizes.add(other.sizes, fill_value=0).astype(np.int64)
+        return AggregateCube(sums.sort_index(), counts.sort_index(), sizes.sort_index())
+
+    def update(self, df):
+        # Fold a batch of raw rows into this cube in place and return the
+        # (year, neighborhood) keys of the cells the batch touched
+        delta = AggregateCube.from_frame(df, self.metrics)
+        merged = self.merge(delta)
+        self.sums, self.counts, self.sizes = merged.sums, merged.counts, merged.sizes
+        return delta.sizes.index
+
+    def cell_means(self, keys=None):
+        # Means of individual (year, neighborhood) cells, optionally only `keys`
+        sums, counts = self.sums, self.counts
+        if keys is not None:
+            sums, counts = sums.loc[keys], counts.loc[keys]
+        return sums / counts.where(counts > 0)
+
+    def save(self, path):
+        pd.to_pickle({'sums': self.sums, 'counts': self.counts, 'sizes': self.sizes}, path)
+
+    @classmethod
+    def load(cls, path):
+        state = pd.read_pickle(path)
+        return cls(state['sums'], state['counts'], state['sizes'])
+
+    def __len__(self):
+        # Number of (year, neighborhood) cells
+        return len(self.sizes)
+
+    @property
+    def metrics(self):
+        return list(self.sums.columns)
+
+    def mean_by(self, levels):
+        # Roll the cube up to `levels` (a key name or a list of key names,
+        # in the order the resulting index should use) and average
+        if isinstance(levels, str):
+            levels = [levels]
+        levels = list(levels)
+        if levels == KEYS:
+            means = self.cell_means()
+        else:
+            sums = self.sums.groupby(level=levels, sort=True, observed=True).sum()
+            counts = self.counts.groupby(level=levels, sort=True, observed=True).sum()
+            # Groups with no non-null values come out as NaN, as with DataFrame.mean
+            means = sums / counts.where(counts > 0)
+        if 'year' not in levels:
+            years = self.sizes.index.get_level_values('year').to_numpy()
+            year_sums = (self.sizes * years).groupby(level=levels, sort=True, observed=True).sum()
+            sizes = self.sizes.groupby(level=levels, sort=True, observed=True).sum()
+            means.insert(0, 'year', year_sums / sizes)
+        # Grouping a categorical level with observed=True keeps first-seen
+        # order, so sort explicitly to match groupby().mean()
+        return means.sort_index()
+
+    def grand_mean(self):
+        # City-wide mean of every metric over all rows
+        counts = self.counts.sum()
+        return self.sums.sum() / counts.where(counts > 0)
+
+
+def summary_frames(cube):
+    """The year and (year, neighborhood) views of the analysis, from a cube.
+
+    Returns ``housing_units_by_year``, ``prices_square_foot_by_year`` and
+    ``prices_by_year_by_neighborhood`` as built in the notebook.
+    """
+    housing_units_by_year = cube.mean_by('year')
+    return {
+        'housing_units_by_year': housing_units_by_year,
+        'prices_square_foot_by_year': housing_units_by_year[PRICE_COLUMNS],
+        'prices_by_year_by_neighborhood': cube.mean_by(KEYS)[PRICE_COLUMNS],
+    }
@@ -0,0 +1,209 @@
+"""Run the housing analysis for many cities across a process pool.
+
+The manifest lists one dataset per city, shaped like the files in
+``Resources``. It is either a CSV or a JSON list of objects with the keys:
+
+* ``city``: name of the summary row; the output folder is a file-system
+  safe form of it (see ``export_figures.slug``), so a name like
+  ``../other`` cannot write outside the output folder
+* ``census``: census CSV (``year, neighborhood, sale_price_sqr_foot, ...``)
+* ``coordinates``: coordinates CSV (``Neighborhood, Lat, Lon``)
+* ``housing`` (optional): headerless ``year, housing_units`` CSV
+
+Relative paths are resolved against the manifest's folder.
+
+Each city runs load -> aggregate -> join -> rank -> export in a worker
+process. The columnar caches of all inputs are built in the parent first,
+so workers only memory-map shared, read-only files. A city that fails is
+reported with its error and does not affect the others. The per-city
+summaries are combined into ``summary.csv`` in the output folder::
+
+    python batch_runner.py cities.json --output reports --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from census_cache import ensure_cache
+from export_figures import slug, unique_slugs
+from rankings import RANK_METRICS
+from san_francisco_housing import HousingAnalysis
+
+
+DEFAULT_TOP_K = 5
+
+
+def read_manifest(path):
+    """List of city dicts from a JSON or CSV manifest, with absolute paths.
+
+    Each dict also gets the ``folder`` its reports are written to.
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.json':
+        with open(path) as handle:
+            entries = json.load(handle)
+    else:
+        entries = pd.read_csv(path).to_dict('records')
+
+    cities = []
+    for entry in entries:
+        city = {'city': str(entry['city'])}
+        for key in ('census', 'coordinates', 'housing'):
+            value = entry.get(key)
+            if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+                if key != 'housing':
+                    raise ValueError(f"manifest entry for {city['city']!r} has no {key!r} path")
+                city[key] = None
+            else:
+                city[key] = str((path.parent / value).resolve())
+        cities.append(city)
+
+    names = [city['city'] for city in cities]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate cities in manifest: {duplicates}")
+    folders = unique_slugs(names)
+    for city in cities:
+        city['folder'] = folders[city['city']]
+    return cities
+
+
+def warm_caches(city):
+    # Build the columnar caches once, before any worker memory-maps them
+    ensure_cache(city['census'])
+    ensure_cache(city['coordinates'])
+    if city['housing'] is not None:
+        ensure_cache(city['housing'], header=None, names=['year', 'housing_units'])
+
+
+def _leader(rank_index, metric):
+    top = rank_index.top(metric, 1)
+    if top.empty:
+        return None
+    return top['Neighborhood'].iloc[0]
+
+
+def leaderboards(rank_index, top_k):
+    # Top-k neighborhoods of every ranked metric, stacked into one table
+    boards = []
+    for metric in RANK_METRICS:
+        top = rank_index.top(metric, top_k)
+        boards.append(top.assign(metric=metric, rank=range(1, len(top) + 1)))
+    return pd.concat(boards, ignore_index=True)
+
+
+def run_city(city, output_dir, top_k=DEFAULT_TOP_K):
+    """Run one city's pipeline and write its reports; returns its summary row.
+
+    Never raises: a failure is returned as a row with ``status='failed'``.
+    """
+    started = time.perf_counter()
+    summary = {'city': city['city'], 'status': 'ok', 'error': None}
+    try:
+        analysis = HousingAnalysis(city['census'], city['coordinates'], city['housing'])
+        city_dir = Path(output_dir) / city.get('folder', slug(city['city']))
+        city_dir.mkdir(parents=True, exist_ok=True)
+
+        all_neighborhoods_df = analysis.all_neighborhoods_df
+        all_neighborhoods_df.to_csv(city_dir / 'all_neighborhoods.csv', index=False)
+        analysis.prices_by_neighborhood_by_year.to_csv(city_dir / 'prices_by_neighborhood_by_year.csv')
+        analysis.housing_units_by_year.to_csv(city_dir / 'housing_units_by_year.csv')
+
+        rank_index = analysis.rank_index
+        leaderboards(rank_index, top_k).to_csv(city_dir / 'leaderboards.csv', index=False)
+
+        by_year = analysis.housing_units_by_year
+        grand_mean = analysis.sfo_data_cube.grand_mean()
+        summary.update({
+            'rows': len(analysis.census),
+            'neighborhoods': analysis.all_neighborhood_info_df.shape[0],
+            'mapped_neighborhoods': len(all_neighborhoods_df),
+            'unmatched_coordinates': len(analysis.unmatched_neighborhoods[0]),
+            'unmatched_census': len(analysis.unmatched_neighborhoods[1]),
+            'first_year': int(by_year.index.min()),
+            'last_year': int(by_year.index.max()),
+            'mean_sale_price_sqr_foot': float(grand_mean['sale_price_sqr_foot']),
+            'mean_gross_rent': float(grand_mean['gross_rent']),
+            'top_gross_rent': _leader(rank_index, 'gross_rent'),
+            'top_sale_price_sqr_foot': _leader(rank_index, 'sale_price_sqr_foot'),
+            'top_rent_to_price': _leader(rank_index, 'rent_to_price'),
+        })
+    except Exception as exc:
+        summary.update(status='failed', error=f"{type(exc).__name__}: {exc}")
+        summary['traceback'] = traceback.format_exc()
+    summary['elapsed_s'] = time.perf_counter() - started
+    return summary
+
+
+def run_batch(cities, output_dir, workers=None, top_k=DEFAULT_TOP_K):
+    """Run every city on a pool of at most ``workers`` processes.
+
+    Returns the combined summary table, one row per city in manifest order,
+    and writes it to ``output_dir/summary.csv``.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    rows = {}
+    runnable = []
+    for city in cities:
+        try:
+            warm_caches(city)
+        except Exception as exc:
+            rows[city['city']] = {
+                'city': city['city'],
+                'status': 'failed',
+                'error': f"{type(exc).__name__}: {exc}",
+                'traceback': traceback.format_exc(),
+            }
+        else:
+            runnable.append(city)
+
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(runnable), 1))) as pool:
+        futures = {pool.submit(run_city, city, output_dir, top_k): city for city in runnable}
+        for future in as_completed(futures):
+            city = futures[future]
+            try:
+                rows[city['city']] = future.result()
+            except Exception as exc:
+                # The worker itself died (for example killed for memory)
+                rows[city['city']] = {
+                    'city': city['city'],
+                    'status': 'failed',
+                    'error': f"{type(exc).__name__}: {exc}",
+                }
+
+    summary = pd.DataFrame([rows[city['city']] for city in cities])
+    summary.drop(columns='traceback', errors='ignore').to_csv(output_dir / 'summary.csv', index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the housing analysis for every city in a manifest.")
+    parser.add_argument('manifest', help="JSON or CSV manifest of city datasets")
+    parser.add_argument('--output', default='reports', help="folder for per-city reports and summary.csv")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args(argv)
+
+    summary = run_batch(read_manifest(args.manifest), args.output, args.workers, args.top_k)
+    print(summary.drop(columns='traceback', errors='ignore').to_string(index=False))
+    failed = summary[summary['status'] != 'ok']
+    for _, row in failed.iterrows():
+        print(f"\n{row['city']} failed: {row['error']}", file=sys.stderr)
+        if isinstance(row.get('traceback'), str):
+            print(row['traceback'], file=sys.stderr)
+    return 1 if len(failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
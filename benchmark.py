@@ -0,0 +1,306 @@
+"""Scaled benchmarks for every stage of the housing analysis.
+
+For each requested size a synthetic census file is generated (see
+``synthetic_data.py``) and each stage of the pipeline is timed and
+memory-profiled on its own:
+
+* ``csv_load``: ``pd.read_csv`` of the census CSV
+* ``cache_build`` / ``cache_load``: first and warm ``read_csv_cached``
+* ``groupby_baseline``: the notebook's five ``groupby().mean()`` calls
+* ``cube_build`` / ``cube_rollups``: the aggregate cube and its rollups
+* ``coordinates_join`` / ``keyed_join``: the concat/dropna join with the
+  coordinates and the normalized-key join that replaces it
+* ``rent_to_price``: the ``rent_to_price`` derivation
+* ``trend_fit``: per-neighborhood trend fits of ``trends.trend_table``
+* ``topk_sort`` / ``topk_index``: leaderboards by full sort and by ``RankIndex``
+  (``topk_index_build`` times building the index)
+* ``plot_construction``: building the hvPlot objects (skipped without hvplot)
+* ``quantile_baseline`` / ``quantile_sketch``: per-cell percentiles by
+  exact ``groupby().quantile()`` and by ``QuantileSketch``
+* ``series_build`` / ``series_resample`` / ``series_rolling``: a monthly
+  feed of the same size as a ``NeighborhoodSeries``, its quarterly and
+  yearly resamples and a 12-month rolling mean, against the yearly
+  ``groupby().mean()`` of the feed (``series_groupby_baseline``)
+* ``stream_cube``: out-of-core ``AggregateCube.from_csv``
+
+Sizes above ``--in-memory-limit`` rows only run ``stream_cube``, so sizes up
+to 10^8 rows can be measured on a normal host.
+
+Wall and CPU time are the best of ``--repeats`` runs. Peak memory is the
+tracemalloc peak of one extra run, made separately because tracing slows
+the stage down. Results are written as JSON. ``--compare`` checks them
+against an earlier file and exits non-zero if any stage got slower than
+``--tolerance`` allows.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggregates import KEYS, NEIGHBORHOOD_YEAR, AggregateCube, add_rent_to_price
+from census_cache import build_cache, read_csv_cached
+from neighborhood_join import join_on_keys
+from quantiles import SUMMARY_QUANTILES, QuantileSketch
+from rankings import RANK_METRICS, RankIndex
+from synthetic_data import generate_coordinates, generate_monthly_census, write_census_csv
+from timeseries import NeighborhoodSeries
+from trends import trend_table
+
+
+DEFAULT_ROWS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_NEIGHBORHOODS = 73
+DEFAULT_IN_MEMORY_LIMIT = 10 ** 7
+DEFAULT_TOLERANCE = 0.25
+
+
+def _row_count(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class StageTimer:
+    """Times and memory-profiles stages, collecting one record per stage."""
+
+    def __init__(self, rows, neighborhoods, repeats):
+        self.rows = rows
+        self.neighborhoods = neighborhoods
+        self.repeats = repeats
+        self.records = []
+
+    def measure(self, stage, func, rows_in=None):
+        wall = cpu = float('inf')
+        for _ in range(self.repeats):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            result = func()
+            wall = min(wall, time.perf_counter() - wall_start)
+            cpu = min(cpu, time.process_time() - cpu_start)
+
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.records.append({
+            'rows': self.rows,
+            'neighborhoods': self.neighborhoods,
+            'stage': stage,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_bytes': peak,
+            'rows_in': rows_in,
+            'rows_out': _row_count(result),
+        })
+        return result
+
+    def skip(self, stage, reason):
+        self.records.append({
+            'rows': self.rows,
+            'neighborhoods': self.neighborhoods,
+            'stage': stage,
+            'skipped': reason,
+        })
+
+
+def _five_groupbys(df):
+    # The notebook's aggregations, each one a full scan of the rows
+    return [
+        df.groupby('year').mean(numeric_only=True),
+        df.groupby('year').mean(numeric_only=True),
+        df.groupby(['year', 'neighborhood']).mean(numeric_only=True),
+        df.groupby('neighborhood').mean(numeric_only=True),
+        df.groupby(['neighborhood', 'year']).mean(numeric_only=True),
+    ]
+
+
+def _coordinates_join(locations, info):
+    joined = pd.concat([locations, info], axis="columns", sort=False)
+    return joined.reset_index().dropna().rename(columns={"index": "Neighborhood"})
+
+
+def _build_plots(frames):
+    import plots
+
+    return [
+        plots.housing_units_by_year_plot(frames['housing_units_by_year']),
+        plots.prices_by_year_by_neighborhood_plot(frames['prices_by_year_by_neighborhood']),
+        plots.all_neighborhoods_df_plot(frames['all_neighborhoods_df']),
+    ]
+
+
+def run_size(rows, neighborhoods, workdir, repeats=3, in_memory_limit=DEFAULT_IN_MEMORY_LIMIT):
+    """Benchmark every stage at one size and return the stage records."""
+    workdir = Path(workdir)
+    census_csv = workdir / f'census_{rows}_{neighborhoods}.csv'
+    write_census_csv(census_csv, rows, neighborhoods)
+    locations = generate_coordinates(neighborhoods).set_index('Neighborhood')
+    timer = StageTimer(rows, neighborhoods, repeats)
+
+    if rows <= in_memory_limit:
+        df = timer.measure('csv_load', lambda: pd.read_csv(census_csv), rows)
+        cache_dir = workdir / f'cache_{rows}_{neighborhoods}'
+        timer.measure('cache_build', lambda: build_cache(census_csv, cache_dir), rows)
+        timer.measure('cache_load', lambda: read_csv_cached(census_csv, cache_dir=cache_dir), rows)
+
+        timer.measure('groupby_baseline', lambda: _five_groupbys(df), rows)
+        cube = timer.measure('cube_build', lambda: AggregateCube.from_frame(df), rows)
+        cells = len(cube.sizes)
+        timer.measure(
+            'cube_rollups',
+            lambda: [cube.mean_by(levels) for levels in ('year', KEYS, 'neighborhood', NEIGHBORHOOD_YEAR)],
+            cells,
+        )
+
+        info = cube.mean_by('neighborhood')
+        joined = timer.measure('coordinates_join', lambda: _coordinates_join(locations, info), len(info))
+        timer.measure('keyed_join', lambda: join_on_keys(locations, info).frame, len(info))
+        timer.measure(
+            'rent_to_price',
+            lambda: add_rent_to_price(cube.mean_by(NEIGHBORHOOD_YEAR)),
+            cells,
+        )
+
+        quantiles = list(SUMMARY_QUANTILES.values())
+        timer.measure(
+            'quantile_baseline',
+            lambda: df.groupby(KEYS)[['sale_price_sqr_foot', 'gross_rent']].quantile(quantiles),
+            rows,
+        )
+        timer.measure('quantile_sketch', lambda: QuantileSketch.from_frame(df).summary(), rows)
+
+        by_year = cube.mean_by(KEYS)
+        timer.measure('trend_fit', lambda: trend_table(by_year), cells)
+
+        ranked = add_rent_to_price(joined.copy())
+        timer.measure(
+            'topk_sort',
+            lambda: [ranked.sort_values(metric).tail(10) for metric in RANK_METRICS],
+            len(ranked),
+        )
+        rank_index = timer.measure('topk_index_build', lambda: RankIndex(joined, by_year), cells)
+        timer.measure(
+            'topk_index',
+            lambda: [rank_index.top(metric, 10) for metric in RANK_METRICS],
+            len(ranked),
+        )
+
+        monthly = generate_monthly_census(rows, neighborhoods)
+        timer.measure(
+            'series_groupby_baseline',
+            lambda: monthly.groupby(KEYS)[['sale_price_sqr_foot', 'gross_rent']].mean(),
+            rows,
+        )
+        series = timer.measure('series_build', lambda: NeighborhoodSeries.from_frame(monthly, 'M'), rows)
+        timer.measure(
+            'series_resample',
+            lambda: [series.resample('Q').to_frame(), series.resample('Y').to_frame()],
+            series.sums.size,
+        )
+        timer.measure('series_rolling', lambda: series.rolling(12).to_frame(), series.sums.size)
+        del monthly
+
+        try:
+            import hvplot.pandas  # noqa: F401
+        except ImportError:
+            timer.skip('plot_construction', 'hvplot is not installed')
+        else:
+            frames = {
+                'housing_units_by_year': cube.mean_by('year'),
+                'prices_by_year_by_neighborhood': by_year,
+                'all_neighborhoods_df': joined,
+            }
+            timer.measure('plot_construction', lambda: _build_plots(frames), cells)
+    else:
+        for stage in ('csv_load', 'groupby_baseline', 'cube_build'):
+            timer.skip(stage, f'more than {in_memory_limit} rows')
+
+    timer.measure('stream_cube', lambda: AggregateCube.from_csv(census_csv), rows)
+    census_csv.unlink()
+    return timer.records
+
+
+def run(rows_list, neighborhoods, repeats=3, in_memory_limit=DEFAULT_IN_MEMORY_LIMIT, workdir=None):
+    records = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for rows in rows_list:
+            records.extend(run_size(rows, neighborhoods, tmp, repeats, in_memory_limit))
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeats': repeats,
+        },
+        'results': records,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Stages whose wall time grew by more than ``tolerance`` against ``baseline``.
+
+    Returns a list of ``(rows, neighborhoods, stage, baseline_s, current_s)``.
+    """
+    def by_key(report):
+        return {
+            (r['rows'], r['neighborhoods'], r['stage']): r
+            for r in report['results'] if 'wall_s' in r
+        }
+
+    before = by_key(baseline)
+    regressions = []
+    for key, record in sorted(by_key(current).items()):
+        if key in before and record['wall_s'] > before[key]['wall_s'] * (1 + tolerance):
+            regressions.append((*key, before[key]['wall_s'], record['wall_s']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the housing analysis.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--neighborhoods', type=int, default=DEFAULT_NEIGHBORHOODS)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--in-memory-limit', type=int, default=DEFAULT_IN_MEMORY_LIMIT)
+    parser.add_argument('--workdir', help="directory for the generated CSVs (default: system temp)")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.neighborhoods, args.repeats, args.in_memory_limit, args.workdir)
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+    for record in report['results']:
+        if 'skipped' in record:
+            print(f"{record['rows']:>12} {record['stage']:<20} skipped: {record['skipped']}")
+        else:
+            print(
+                f"{record['rows']:>12} {record['stage']:<20} "
+                f"{record['wall_s'] * 1000:10.2f} ms {record['peak_bytes'] / 2 ** 20:10.2f} MiB"
+            )
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for rows, neighborhoods, stage, before, after in regressions:
+            print(f"REGRESSION {stage} at {rows} rows x {neighborhoods}: {before:.4f}s -> {after:.4f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Memory-mapped columnar cache for the CSV files in ``Resources``.
+
+The first time a CSV is read it is parsed once with ``pd.read_csv`` and
+every column is written to its own ``.npy`` file. Text columns are stored
+as integer codes plus a list of distinct values. Later reads memory-map the
+``.npy`` files instead of parsing text again, so numeric columns reach the
+DataFrame without being copied.
+
+A cache entry is keyed on the source file's size, modification time and
+SHA-256 digest. When size and mtime match, the entry is used without
+touching the CSV. When only the mtime changed (the file was copied or
+touched), the digest decides whether the entry is still valid. Any other
+change rebuilds the entry, as does reading with different ``pd.read_csv``
+options (for example ``header=None`` for ``housing_per_year.csv``).
+
+Entries live next to the source in ``Resources/.cache/``. When that folder
+cannot be written (a read-only checkout or install), they go to a per-user
+cache under ``$XDG_CACHE_HOME`` (default ``~/.cache``) instead, and if no
+cache can be written at all ``read_csv_cached`` falls back to
+``pd.read_csv``.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Bump when the on-disk layout changes so old entries are rebuilt
+CACHE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_digest(path, block_size=1 << 20):
+    # SHA-256 of the file contents, read in fixed-size blocks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir(path):
+    # Entries live next to the source, e.g. Resources/.cache/<file name>/
+    path = Path(path)
+    return path.parent / '.cache' / path.name
+
+
+def user_cache_dir(path):
+    # Per-user fallback, keyed on the source's folder so equal names do not collide
+    path = Path(path).resolve()
+    root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+    folder = hashlib.sha256(str(path.parent).encode()).hexdigest()[:16]
+    return root / 'san_francisco_housing' / folder / path.name
+
+
+def cache_dirs(path):
+    # Candidate entry locations for ``path``, in order of preference
+    return [default_cache_dir(path), user_cache_dir(path)]
+
+
+def writable(directory):
+    # Whether ``directory``, or the nearest ancestor that exists, can be written
+    directory = Path(directory).absolute()
+    while not directory.exists() and directory != directory.parent:
+        directory = directory.parent
+    return os.access(directory, os.W_OK)
+
+
+def _source_stats(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(cache_dir / MANIFEST_NAME) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(cache_dir, manifest):
+    tmp_path = cache_dir / (MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(tmp_path, cache_dir / MANIFEST_NAME)
+
+
+def _is_text(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def build_cache(path, cache_dir=None, **read_csv_kwargs):
+    """Parse ``path`` once and write its columnar cache entry.
+
+    ``read_csv_kwargs`` are passed to ``pd.read_csv`` and must be JSON
+    serialisable, since they are recorded in the entry's manifest.
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(path)
+    stats = _source_stats(path)
+    df = pd.read_csv(path, **read_csv_kwargs)
+
+    columns = []
+    # Write into a sibling temp directory and swap it in, so readers never
+    # see a half-written entry
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=cache_dir.name + '.', dir=cache_dir.parent))
+    try:
+        for position, name in enumerate(df.columns):
+            series = df[name]
+            file_name = f'{position}.npy'
+            if _is_text(series):
+                codes, categories = pd.factorize(series, sort=True)
+                np.save(tmp_dir / file_name, codes.astype(np.int32))
+                columns.append({
+                    'name': name,
+                    'file': file_name,
+                    'kind': 'text',
+                    'categories': categories.tolist(),
+                })
+            else:
+                np.save(tmp_dir / file_name, series.to_numpy())
+                columns.append({'name': name, 'file': file_name, 'kind': 'numeric'})
+
+        manifest = {
+            'version': CACHE_VERSION,
+            'source': str(path),
+            'size': stats['size'],
+            'mtime_ns': stats['mtime_ns'],
+            'sha256': file_digest(path),
+            'read_options': read_csv_kwargs,
+            'rows': len(df),
+            'columns': columns,
+        }
+        _write_manifest(tmp_dir, manifest)
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _ensure(path, cache_dir, read_csv_kwargs):
+    manifest = _read_manifest(cache_dir)
+    # Round-trip the options through JSON so tuples compare equal to lists
+    read_options = json.loads(json.dumps(read_csv_kwargs))
+    if manifest is None or manifest['read_options'] != read_options:
+        return build_cache(path, cache_dir, **read_csv_kwargs)
+
+    stats = _source_stats(path)
+    if manifest['size'] != stats['size']:
+        return build_cache(path, cache_dir, **read_csv_kwargs)
+    if manifest['mtime_ns'] == stats['mtime_ns']:
+        return manifest
+
+    # Same size but a new mtime: only a content change invalidates the entry
+    if file_digest(path) != manifest['sha256']:
+        return build_cache(path, cache_dir, **read_csv_kwargs)
+    manifest['mtime_ns'] = stats['mtime_ns']
+    try:
+        _write_manifest(cache_dir, manifest)
+    except OSError:
+        # A read-only entry stays valid; the digest is just checked again next time
+        pass
+    return manifest
+
+
+def _ensure_entry(path, cache_dir, read_csv_kwargs):
+    # (cache_dir, manifest) of a valid entry; without an explicit cache_dir,
+    # the first candidate location that has or can take the entry
+    path = Path(path)
+    if cache_dir is not None:
+        return Path(cache_dir), _ensure(path, Path(cache_dir), read_csv_kwargs)
+    error = None
+    for candidate in cache_dirs(path):
+        try:
+            return candidate, _ensure(path, candidate, read_csv_kwargs)
+        except OSError as exc:
+            error = exc
+    raise error
+
+
+def ensure_cache(path, cache_dir=None, **read_csv_kwargs):
+    """Return the manifest of a valid cache entry for ``path``, building it if needed.
+
+    Raises ``OSError`` if no entry can be read or written.
+    """
+    return _ensure_entry(path, cache_dir, read_csv_kwargs)[1]
+
+
+def load_columns(path, cache_dir=None, **read_csv_kwargs):
+    """Memory-map the cached columns of ``path``.
+
+    Returns ``(arrays, categories)``: ``arrays`` maps each column name to a
+    copy-on-write memory-mapped array (integer codes for text columns) and
+    ``categories`` maps each text column to its distinct values. Writes to
+    an array stay in memory and never reach the cache files.
+    """
+    cache_dir, manifest = _ensure_entry(path, cache_dir, read_csv_kwargs)
+    arrays = {}
+    categories = {}
+    for column in manifest['columns']:
+        arrays[column['name']] = np.load(cache_dir / column['file'], mmap_mode='c')
+        if column['kind'] == 'text':
+            categories[column['name']] = column['categories']
+    return arrays, categories
+
+
+def read_csv_cached(path, index_col=None, categorical=False, cache_dir=None, **read_csv_kwargs):
+    """Drop-in replacement for ``pd.read_csv`` backed by the columnar cache.
+
+    Numeric columns share memory with the memory-mapped cache files. Text
+    columns are decoded back to ``object`` strings by default, matching
+    ``pd.read_csv``. With ``categorical=True`` they are returned as
+    ``Categorical`` columns built from the cached codes instead, which skips
+    materialising one Python string per row. Other keyword arguments are
+    forwarded to ``pd.read_csv`` when the entry is built. If no cache
+    location can be written, the CSV is parsed with ``pd.read_csv``.
+    """
+    try:
+        arrays, categories = load_columns(path, cache_dir, **read_csv_kwargs)
+    except OSError:
+        df = pd.read_csv(path, **read_csv_kwargs)
+        if categorical:
+            text = [name for name in df.columns if _is_text(df[name])]
+            df = df.astype({name: 'category' for name in text})
+        return df.set_index(index_col) if index_col is not None else df
+    data = {}
+    for name, values in arrays.items():
+        if name in categories:
+            # Code -1 marks a missing value and decodes to NaN
+            column = pd.Categorical.from_codes(
+                values, pd.Index(categories[name], dtype=object)
+            )
+            data[name] = column if categorical else np.asarray(column, dtype=object)
+        else:
+            data[name] = values
+    df = pd.DataFrame(data, copy=False)
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
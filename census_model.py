@@ -0,0 +1,197 @@
+"""Normalized, dictionary-encoded representation of the census table.
+
+``sfo_neighborhoods_census_data.csv`` repeats the city-wide
+``housing_units`` and ``gross_rent`` of a year on every neighborhood row.
+``CensusTable`` stores those per-year values once in a year dimension, keyed
+by ``year`` and seeded from ``housing_per_year.csv``. The remaining fact
+table only holds the per-row columns:
+
+* ``year`` as ``int16``
+* ``neighborhood`` as a ``Categorical``, so grouping works on integer codes
+* ``sale_price_sqr_foot`` as ``float32``
+
+A feed whose ``housing_units`` or ``gross_rent`` varies between rows of the
+same year (transaction-level data, for example) cannot use the dimension for
+that column. The column is then kept per row in the fact table as
+``float32``, and every view uses the per-row values.
+
+The wide, one-row-per-record layout of ``sfo_data_df`` is rebuilt on first
+use of ``wide()`` and memoized.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggregates import DEFAULT_CHUNKSIZE, AggregateCube, KEYS, METRICS
+from census_cache import read_csv_cached
+
+
+CENSUS_PATH = Path('./Resources/sfo_neighborhoods_census_data.csv')
+HOUSING_PATH = Path('./Resources/housing_per_year.csv')
+
+# Columns that hold one city-wide value per year
+YEAR_COLUMNS = ['housing_units', 'gross_rent']
+
+
+def _varying_years(census_df, columns):
+    # {column: years in which its value differs between rows}
+    if not columns:
+        return {}
+    per_year = census_df.groupby('year')[list(columns)].agg(['min', 'max'])
+    varying = {}
+    for column in columns:
+        differs = per_year[(column, 'min')] != per_year[(column, 'max')]
+        if differs.any():
+            varying[column] = differs[differs].index.tolist()
+    return varying
+
+
+def row_columns(census_df):
+    """The ``YEAR_COLUMNS`` whose value varies within a year, to keep per row."""
+    return list(_varying_years(census_df, YEAR_COLUMNS))
+
+
+def load_year_dimension(census_df, housing_path=HOUSING_PATH, columns=YEAR_COLUMNS):
+    """Build the per-year dimension table of ``columns``, indexed by an ``int16`` year.
+
+    ``housing_units`` comes from ``housing_path``. ``gross_rent`` is not in
+    that file, so it is taken from the census rows, which must hold a single
+    value per year. Both sources must agree on ``housing_units``. With
+    ``housing_path=None`` both columns are taken from the census rows.
+    Leave columns that vary within a year out of ``columns`` (see
+    ``row_columns``); the file is not read when ``housing_units`` is left out.
+    """
+    columns = [column for column in YEAR_COLUMNS if column in columns]
+    varying = _varying_years(census_df, columns)
+    if varying:
+        column, years = next(iter(varying.items()))
+        raise ValueError(f"{column} is not constant within year(s) {years}")
+    census_years = census_df.groupby('year')[columns].min()
+    census_years.index = census_years.index.astype(np.int16)
+
+    if 'housing_units' not in columns:
+        years = census_years
+        if 'gross_rent' in years:
+            years['gross_rent'] = years['gross_rent'].astype(np.float32)
+        years.index.name = 'year'
+        return years
+
+    if housing_path is None:
+        years = census_years[['housing_units']]
+    else:
+        housing = read_csv_cached(housing_path, header=None, names=['year', 'housing_units'])
+        years = housing.set_index(housing['year'].astype(np.int16))[['housing_units']]
+
+    missing = census_years.index.difference(years.index)
+    if len(missing):
+        raise ValueError(f"{housing_path} has no housing_units for year(s) {missing.tolist()}")
+    mismatch = census_years['housing_units'] != years['housing_units'].reindex(census_years.index)
+    if mismatch.any():
+        raise ValueError(
+            f"housing_units in {housing_path} disagree with the census for year(s) "
+            f"{mismatch[mismatch].index.tolist()}"
+        )
+
+    years = years.join(census_years[[c for c in columns if c != 'housing_units']], how='left')
+    years['housing_units'] = pd.to_numeric(years['housing_units'], downcast='integer')
+    if 'gross_rent' in years:
+        years['gross_rent'] = years['gross_rent'].astype(np.float32)
+    years.index.name = 'year'
+    return years
+
+
+class CensusTable:
+    """Census facts plus a year dimension, joined back together on demand."""
+
+    def __init__(self, facts, years):
+        self.facts = facts
+        self.years = years
+        self._wide = None
+
+    @classmethod
+    def load(cls, census_path=CENSUS_PATH, housing_path=HOUSING_PATH):
+        census_df = read_csv_cached(census_path, categorical=True)
+        per_row = row_columns(census_df)
+        years = load_year_dimension(
+            census_df, housing_path, [column for column in YEAR_COLUMNS if column not in per_row]
+        )
+        facts = pd.DataFrame({
+            'year': census_df['year'].astype(np.int16),
+            'neighborhood': census_df['neighborhood'],
+            'sale_price_sqr_foot': census_df['sale_price_sqr_foot'].astype(np.float32),
+            **{column: census_df[column].astype(np.float32) for column in per_row},
+        })
+        return cls(facts, years)
+
+    def __len__(self):
+        return len(self.facts)
+
+    @property
+    def row_columns(self):
+        # Year columns stored per row in the facts rather than in the dimension
+        return [column for column in YEAR_COLUMNS if column in self.facts.columns]
+
+    @property
+    def neighborhoods(self):
+        return self.facts['neighborhood'].cat.categories
+
+    def memory_usage(self):
+        # Resident bytes of the normalized tables, for comparison with the wide form
+        return int(
+            self.facts.memory_usage(index=True, deep=True).sum()
+            + self.years.memory_usage(index=True, deep=True).sum()
+        )
+
+    def wide(self):
+        """Return the rejoined ``sfo_data_df`` layout, built once and memoized."""
+        if self._wide is None:
+            year_values = self.years.reindex(self.facts['year'].to_numpy())
+            wide = self.facts.copy()
+            for column in YEAR_COLUMNS:
+                if column not in wide:
+                    wide[column] = year_values[column].to_numpy()
+            self._wide = wide[KEYS + METRICS]
+        return self._wide
+
+    def batches(self, size=DEFAULT_CHUNKSIZE, columns=METRICS):
+        """Yield the wide layout of ``columns`` in slices of at most ``size`` rows.
+
+        Only one slice at a time is joined to the year dimension, so the
+        full ``wide()`` frame is never built.
+        """
+        columns = list(columns)
+        year_columns = [column for column in self.years.columns if column in columns]
+        for start in range(0, len(self.facts), size):
+            batch = self.facts.iloc[start:start + size]
+            year_values = self.years.reindex(batch['year'].to_numpy())
+            batch = batch.assign(**{column: year_values[column].to_numpy() for column in year_columns})
+            yield batch[KEYS + columns]
+
+    def cube(self):
+        """Build the (year, neighborhood) aggregate cube without widening.
+
+        Prices and any per-row year columns are aggregated from the fact
+        table on the neighborhood codes. The dimension's columns are
+        constant within a year, so their cell sums are the year value times
+        the cell's row count.
+        """
+        grouped = self.facts.groupby(KEYS, sort=True, observed=True)
+        grouped = grouped[['sale_price_sqr_foot'] + self.row_columns]
+        sizes = grouped.size()
+        sums = grouped.sum().astype(np.float64)
+        counts = grouped.count()
+
+        cell_years = sizes.index.get_level_values('year')
+        year_values = self.years.reindex(cell_years)
+        for column in self.years.columns:
+            values = year_values[column].to_numpy(dtype=np.float64)
+            present = ~np.isnan(values)
+            sums[column] = np.where(present, values, 0) * sizes.to_numpy()
+            counts[column] = np.where(present, sizes.to_numpy(), 0)
+        # Plain int64 years in the cube, as pd.read_csv gives the wide frame;
+        # int16 only saves memory in the fact table
+        index = sizes.index.set_levels(sizes.index.levels[0].astype(np.int64), level='year')
+        sums.index = counts.index = sizes.index = index
+        return AggregateCube(sums[METRICS], counts[METRICS], sizes)
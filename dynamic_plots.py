@@ -0,0 +1,123 @@
+"""Server-side rendering of the per-neighborhood plots, one frame at a time.
+
+``hvplot.line(groupby='neighborhood')`` embeds a frame for every
+neighborhood when the plot is exported, so the page grows with the number of
+neighborhoods. ``NeighborhoodPlotApp`` instead serves a Panel app from a
+local Bokeh server. The browser receives only the frame of the neighborhood
+picked in the dropdown, and that frame is rendered on the server when it is
+asked for.
+
+Each neighborhood's rows are sliced out once up front, and rendered frames
+are kept in a bounded LRU cache, so revisiting a neighborhood is free and
+memory stays capped however many neighborhoods there are. hvplot and panel
+are imported when the app is built, not when this module is imported.
+"""
+
+from functools import lru_cache
+
+from aggregates import NEIGHBORHOOD_YEAR
+from plots import load_hvplot
+
+
+# Rendered frames kept per app
+DEFAULT_CACHE_SIZE = 128
+DEFAULT_PORT = 5006
+
+# Options of the two per-neighborhood plots in the notebook
+PRICE_PLOT = dict(
+    title="Average Sale Price Per Square Foot and Gross Rent by Neighborhood",
+    xlabel="Years",
+    ylabel="USD"
+)
+RENT_TO_PRICE_PLOT = dict(
+    y='rent_to_price',
+    title="Gross Rent to Sales Price Per Square Foot by Neighborhood",
+    ylabel="Gross Rent to Sales Price Per Square Foot",
+    xlabel="Year"
+)
+
+
+def neighborhood_slices(frame):
+    """Split a frame indexed by neighborhood and year into one frame per neighborhood.
+
+    Each slice is indexed by ``year`` alone and sorted, ready to plot.
+    """
+    frame = frame.reorder_levels(NEIGHBORHOOD_YEAR).sort_index()
+    return {
+        neighborhood: rows.droplevel('neighborhood')
+        for neighborhood, rows in frame.groupby(level='neighborhood', sort=True, observed=True)
+    }
+
+
+class NeighborhoodPlotApp:
+    """Dropdown-driven line plot that renders one neighborhood on demand.
+
+    ``frame`` is indexed by ``(year, neighborhood)`` or
+    ``(neighborhood, year)``, like ``prices_by_year_by_neighborhood`` or
+    ``prices_by_neighborhood_by_year``. ``plot_options`` are passed to
+    ``hvplot.line`` for every frame.
+    """
+
+    def __init__(self, frame, plot_options=PRICE_PLOT, cache_size=DEFAULT_CACHE_SIZE):
+        self.slices = neighborhood_slices(frame)
+        self.plot_options = dict(plot_options)
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+
+    @property
+    def neighborhoods(self):
+        return list(self.slices)
+
+    def _render(self, neighborhood):
+        load_hvplot()
+        title = self.plot_options.get('title')
+        options = dict(self.plot_options, title=f"{title}: {neighborhood}" if title else neighborhood)
+        return self.slices[neighborhood].hvplot.line(x='year', **options)
+
+    def app(self, neighborhood=None):
+        # The widget and the plot it drives; only the selected frame is rendered
+        import panel as pn
+
+        select = pn.widgets.Select(
+            name='neighborhood',
+            options=self.neighborhoods,
+            value=neighborhood or self.neighborhoods[0],
+        )
+        return pn.Column(select, pn.bind(self.render, select))
+
+    def serve(self, port=DEFAULT_PORT, show=True, **kwargs):
+        """Serve the app from a local Bokeh server; blocks until stopped."""
+        import panel as pn
+
+        # A fresh app per browser session, all sharing this object's frame cache
+        return pn.serve(self.app, port=port, show=show, **kwargs)
+
+
+def serve_analysis(analysis, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE, show=True):
+    """Serve both per-neighborhood plots of ``analysis`` as tabs of one app."""
+    import panel as pn
+
+    prices = NeighborhoodPlotApp(analysis.prices_by_year_by_neighborhood, PRICE_PLOT, cache_size)
+    rent_to_price = NeighborhoodPlotApp(
+        analysis.prices_by_neighborhood_by_year, RENT_TO_PRICE_PLOT, cache_size
+    )
+
+    def app():
+        return pn.Tabs(
+            ('Prices by neighborhood', prices.app()),
+            ('Rent to price by neighborhood', rent_to_price.app()),
+        )
+
+    return pn.serve(app, port=port, show=show)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from san_francisco_housing import default_analysis
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--no-show', action='store_true', help="don't open a browser")
+    args = parser.parse_args()
+    serve_analysis(default_analysis(), args.port, args.cache_size, show=not args.no_show)
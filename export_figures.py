@@ -0,0 +1,262 @@
+"""Headless export of the report figures to PNG, SVG and HTML files.
+
+Builds the notebook's figures without Jupyter and writes them to an output
+folder:
+
+* ``housing_units_by_year.<fmt>`` and ``prices_square_foot_by_year.<fmt>``
+* ``neighborhood_map.<fmt>``: the geo map of ``all_neighborhoods_df`` from
+  ``HousingAnalysis.neighborhood_map``
+* ``neighborhoods/<name>/prices.<fmt>`` and
+  ``neighborhoods/<name>/rent_to_price.<fmt>``: one pair of line plots per
+  neighborhood, like the frames of the notebook's dropdown plots. Names
+  whose folder names would collide get a short hash of the name appended.
+
+The data is loaded once in the parent, which also fills the stage cache
+(see ``pipeline.py``). Each worker process then reads the frames from that
+cache once, at start-up, and renders batches of figures with them. A worker
+keeps a single headless browser for all of its PNG and SVG exports, since
+starting one per figure would dominate the run time. A figure that fails
+is recorded with its error in ``figures.csv`` and does not stop the others,
+and neither does a worker that fails to start or dies: its batches are
+recorded as failed::
+
+    python export_figures.py --output report --formats png html --workers 8
+
+HTML needs holoviews and bokeh; PNG and SVG also need selenium with a
+Chrome or Firefox webdriver.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+from operator import attrgetter, methodcaller
+from pathlib import Path
+
+import pandas as pd
+
+from dynamic_plots import PRICE_PLOT, RENT_TO_PRICE_PLOT, NeighborhoodPlotApp
+from san_francisco_housing import RESOURCES, HousingAnalysis
+
+
+FORMATS = ['png', 'svg', 'html']
+DEFAULT_FORMATS = ['png', 'html']
+DEFAULT_BATCH_SIZE = 50
+
+# Figures drawn once for the whole city, built from a HousingAnalysis
+CITY_FIGURES = {
+    'housing_units_by_year': attrgetter('housing_units_by_year_plot'),
+    'prices_square_foot_by_year': attrgetter('prices_square_foot_by_year_plot'),
+    'neighborhood_map': methodcaller('neighborhood_map'),
+}
+NEIGHBORHOOD_FIGURES = ['prices', 'rent_to_price']
+
+_SEPARATORS = re.compile(r'[^\w-]+')
+
+# Per-process state of a worker, set up by _init_worker
+_worker = {}
+
+
+def slug(name):
+    # File-system safe folder name for a neighborhood
+    return _SEPARATORS.sub('_', name.strip()).strip('_') or 'unnamed'
+
+
+def unique_slugs(names):
+    """Map every name to a folder name no other name in ``names`` shares.
+
+    Folder names are compared case-insensitively, for case-insensitive file
+    systems; colliding ones get a short hash of the full name appended.
+    """
+    slugs = {name: slug(name) for name in names}
+    counts = {}
+    for folder in slugs.values():
+        counts[folder.casefold()] = counts.get(folder.casefold(), 0) + 1
+    return {
+        name: folder if counts[folder.casefold()] == 1
+        else f"{folder}_{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+        for name, folder in slugs.items()
+    }
+
+
+def _init_worker(census_path, coordinates_path, housing_path):
+    analysis = HousingAnalysis(census_path, coordinates_path, housing_path, stage_cache=True)
+    _worker['analysis'] = analysis
+    # No LRU: every neighborhood frame is rendered exactly once
+    _worker['prices'] = NeighborhoodPlotApp(analysis.prices_by_year_by_neighborhood, PRICE_PLOT, 0)
+    _worker['rent_to_price'] = NeighborhoodPlotApp(
+        analysis.prices_by_neighborhood_by_year, RENT_TO_PRICE_PLOT, 0
+    )
+    _worker['driver'] = None
+
+
+def _webdriver():
+    # One headless browser per worker, created on the first PNG or SVG
+    if _worker['driver'] is None:
+        from bokeh.io.webdriver import webdriver_control
+
+        driver = webdriver_control.create()
+        # Close the browser when the worker process exits
+        Finalize(None, driver.quit, exitpriority=10)
+        _worker['driver'] = driver
+    return _worker['driver']
+
+
+def save_figure(figure, path, fmt):
+    """Write a holoviews ``figure`` to ``path`` as ``png``, ``svg`` or ``html``."""
+    import holoviews as hv
+
+    if fmt == 'html':
+        hv.save(figure, path, fmt='html', backend='bokeh')
+        return
+
+    from bokeh.io import export_png, export_svg
+
+    model = hv.render(figure, backend='bokeh')
+    if fmt == 'svg':
+        model.output_backend = 'svg'
+        export_svg(model, filename=str(path), webdriver=_webdriver())
+    else:
+        export_png(model, filename=str(path), webdriver=_webdriver())
+
+
+def _build(figure, neighborhood):
+    if neighborhood is None:
+        return CITY_FIGURES[figure](_worker['analysis'])
+    return _worker[figure].render(neighborhood)
+
+
+def _job_folder(output_dir, folder):
+    # City figures go to the output folder itself
+    return output_dir if folder is None else output_dir / 'neighborhoods' / folder
+
+
+def _render_batch(jobs, output_dir, formats):
+    # Worker: render a batch of (figure, neighborhood, folder) jobs in every format
+    output_dir = Path(output_dir)
+    records = []
+    for figure, neighborhood, folder in jobs:
+        folder, stem = _job_folder(output_dir, folder), figure
+        started = time.perf_counter()
+        try:
+            plot = _build(figure, neighborhood)
+        except Exception as exc:
+            plot, build_error = None, f"{type(exc).__name__}: {exc}"
+        for fmt in formats:
+            record = {'figure': figure, 'neighborhood': neighborhood, 'format': fmt,
+                      'path': str(folder / f'{stem}.{fmt}'), 'status': 'ok', 'error': None}
+            if plot is None:
+                record.update(status='failed', error=build_error)
+            else:
+                try:
+                    folder.mkdir(parents=True, exist_ok=True)
+                    save_figure(plot, folder / f'{stem}.{fmt}', fmt)
+                except Exception as exc:
+                    record.update(status='failed', error=f"{type(exc).__name__}: {exc}")
+                    record['traceback'] = traceback.format_exc()
+            record['elapsed_s'] = time.perf_counter() - started
+            started = time.perf_counter()
+            records.append(record)
+    return records
+
+
+def _failed_batch(jobs, output_dir, formats, error):
+    # Records for a batch whose worker raised or never started
+    return [
+        {'figure': figure, 'neighborhood': neighborhood, 'format': fmt,
+         'path': str(_job_folder(Path(output_dir), folder) / f'{figure}.{fmt}'),
+         'status': 'failed', 'error': error, 'elapsed_s': 0.0}
+        for figure, neighborhood, folder in jobs for fmt in formats
+    ]
+
+
+def figure_jobs(neighborhoods):
+    # The city figures, then both per-neighborhood figures of every neighborhood,
+    # as (figure, neighborhood, folder) with folder None for the city figures
+    folders = unique_slugs(neighborhoods)
+    jobs = [(figure, None, None) for figure in CITY_FIGURES]
+    jobs += [(figure, name, folders[name]) for name in neighborhoods for figure in NEIGHBORHOOD_FIGURES]
+    return jobs
+
+
+def export(output_dir, formats=DEFAULT_FORMATS, neighborhoods=None, workers=None,
+           batch_size=DEFAULT_BATCH_SIZE, census_path=RESOURCES / 'sfo_neighborhoods_census_data.csv',
+           coordinates_path=RESOURCES / 'neighborhoods_coordinates.csv',
+           housing_path=RESOURCES / 'housing_per_year.csv'):
+    """Export every figure in ``formats`` to ``output_dir``.
+
+    ``neighborhoods`` limits the per-neighborhood figures (default: all).
+    Returns one row per written file with its status, and writes the table
+    to ``output_dir/figures.csv``.
+    """
+    unknown = sorted(set(formats) - set(FORMATS))
+    if unknown:
+        raise ValueError(f"unsupported formats {unknown}; choose from {FORMATS}")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = (census_path, coordinates_path, housing_path)
+
+    # Compute the frames once here; the workers load them from the stage cache
+    analysis = HousingAnalysis(*paths, stage_cache=True)
+    analysis.all_neighborhoods_df
+    analysis.housing_units_by_year
+    analysis.prices_by_neighborhood_by_year
+    available = list(analysis.prices_by_year_by_neighborhood.index.unique('neighborhood'))
+    if neighborhoods is None:
+        neighborhoods = available
+    missing = sorted(set(neighborhoods) - set(available))
+    if missing:
+        raise ValueError(f"unknown neighborhoods: {missing}")
+
+    jobs = figure_jobs(neighborhoods)
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    workers = min(workers or os.cpu_count() or 1, max(len(batches), 1))
+
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=paths) as pool:
+        futures = {pool.submit(_render_batch, batch, output_dir, list(formats)): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                records.extend(future.result())
+            except Exception as exc:
+                # BrokenProcessPool when a worker fails to start or dies
+                error = f"{type(exc).__name__}: {exc}"
+                records.extend(_failed_batch(futures[future], output_dir, formats, error))
+
+    table = pd.DataFrame(records)
+    table = table.sort_values(['neighborhood', 'figure', 'format'], na_position='first', ignore_index=True)
+    table.drop(columns='traceback', errors='ignore').to_csv(output_dir / 'figures.csv', index=False)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the report figures to static files.")
+    parser.add_argument('--output', default='figures', help="folder for the exported files")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=DEFAULT_FORMATS)
+    parser.add_argument('--neighborhoods', nargs='+', help="only these neighborhoods (default: all)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="figures rendered per task")
+    parser.add_argument('--census', default=RESOURCES / 'sfo_neighborhoods_census_data.csv')
+    parser.add_argument('--coordinates', default=RESOURCES / 'neighborhoods_coordinates.csv')
+    parser.add_argument('--housing', default=RESOURCES / 'housing_per_year.csv')
+    args = parser.parse_args(argv)
+
+    table = export(
+        args.output, args.formats, args.neighborhoods, args.workers, args.batch_size,
+        args.census, args.coordinates, args.housing,
+    )
+    failed = table[table['status'] != 'ok']
+    print(f"{len(table) - len(failed)} files written to {args.output}, {len(failed)} failed")
+    for _, row in failed.head(10).iterrows():
+        print(f"{row['path']}: {row['error']}", file=sys.stderr)
+    return 1 if len(failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
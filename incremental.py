@@ -0,0 +1,68 @@
+"""Incremental refresh of the aggregates when new census rows arrive.
+
+The aggregate cube and the derived ``prices_by_neighborhood_by_year`` frame
+(with its ``rent_to_price`` column) are persisted between runs. When a new
+batch of rows lands, only that batch is aggregated: it is folded into the
+cube, and the derived frame is recomputed for the (neighborhood, year) cells
+the batch touched. Every other cell is left as it was.
+"""
+
+import pandas as pd
+
+from aggregates import NEIGHBORHOOD_YEAR, AggregateCube, add_rent_to_price
+
+
+def prices_by_neighborhood_by_year(cube):
+    """The notebook's ``prices_by_neighborhood_by_year`` frame, from a cube."""
+    return add_rent_to_price(cube.mean_by(NEIGHBORHOOD_YEAR))
+
+
+class IncrementalReport:
+    """Persisted cube plus the ``rent_to_price`` view, refreshed from deltas."""
+
+    def __init__(self, cube, prices=None):
+        self.cube = cube
+        if prices is None:
+            prices = prices_by_neighborhood_by_year(cube)
+        self.prices_by_neighborhood_by_year = prices
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(AggregateCube.from_frame(df))
+
+    @property
+    def rent_to_price(self):
+        return self.prices_by_neighborhood_by_year['rent_to_price']
+
+    def append(self, new_rows):
+        """Fold ``new_rows`` in and refresh the cells they touch.
+
+        Returns the ``(neighborhood, year)`` keys that were recomputed.
+        """
+        keys = self.cube.update(new_rows)
+        cells = add_rent_to_price(self.cube.cell_means(keys).reorder_levels(NEIGHBORHOOD_YEAR))
+
+        prices = self.prices_by_neighborhood_by_year
+        known = cells.index.isin(prices.index)
+        if known.any():
+            prices.loc[cells.index[known]] = cells[known]
+        if not known.all():
+            # New neighborhoods or a new year: add their rows in index order
+            prices = pd.concat([prices, cells[~known]]).sort_index()
+        self.prices_by_neighborhood_by_year = prices
+        return cells.index
+
+    def save(self, path):
+        pd.to_pickle(
+            {
+                'cube': {'sums': self.cube.sums, 'counts': self.cube.counts, 'sizes': self.cube.sizes},
+                'prices': self.prices_by_neighborhood_by_year,
+            },
+            path,
+        )
+
+    @classmethod
+    def load(cls, path):
+        state = pd.read_pickle(path)
+        cube = state['cube']
+        return cls(AggregateCube(cube['sums'], cube['counts'], cube['sizes']), state['prices'])
@@ -0,0 +1,242 @@
+"""Lightweight per-stage instrumentation of the analysis.
+
+Each named stage (loading the census, building the cube, the coordinates
+join, plot construction, ...) runs inside a span. A span records:
+
+* wall time and CPU time
+* the growth of the process's peak RSS
+* the tracemalloc peak above the stage's starting allocation, when memory
+  tracing is on (nested spans do not hide each other's peaks)
+* rows in and rows out
+* whether the output came from a cache, for stages that have one
+* optionally a cProfile dump of the stage
+
+Finished spans are appended as JSON lines to a trace file and kept in
+``records()``. Instrumentation is off by default. While off, ``span()``
+returns a shared no-op object and ``traced`` functions pay a single flag
+check.
+
+Enable it from code with ``configure()``, or from the environment::
+
+    SFH_TRACE=trace.jsonl SFH_PROFILE=cube_build python san_francisco_housing.py
+"""
+
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class _State:
+    enabled = False
+    trace_path = None
+    memory = False
+    profile_stages = frozenset()
+    profile_dir = Path('.')
+
+
+_state = _State()
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(enabled=True, trace_path=None, memory=True, profile_stages=(), profile_dir='.'):
+    """Turn instrumentation on or off.
+
+    ``trace_path`` receives one JSON object per finished span. ``memory``
+    starts tracemalloc, which slows allocation-heavy code noticeably.
+    Stages named in ``profile_stages`` are also run under cProfile and
+    dumped to ``profile_dir``.
+    """
+    _state.enabled = enabled
+    _state.trace_path = Path(trace_path) if trace_path else None
+    _state.memory = enabled and memory
+    _state.profile_stages = frozenset(profile_stages)
+    _state.profile_dir = Path(profile_dir)
+    if _state.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def configure_from_env(environ=os.environ):
+    # SFH_TRACE=<path> enables tracing; SFH_PROFILE=<stage>[,<stage>...] adds cProfile
+    trace_path = environ.get('SFH_TRACE')
+    if trace_path:
+        profile = [s for s in environ.get('SFH_PROFILE', '').split(',') if s]
+        configure(
+            trace_path=trace_path,
+            memory=environ.get('SFH_TRACE_MEMORY', '1') != '0',
+            profile_stages=profile,
+            profile_dir=environ.get('SFH_PROFILE_DIR', '.'),
+        )
+
+
+def records():
+    # Spans finished in this process, oldest first
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def row_count(value):
+    # len() of a stage's input or output, or None when it has no length
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class _NullSpan:
+    # Returned while instrumentation is off; accepts and ignores everything
+    rows_in = None
+    rows_out = None
+    cached = None
+
+    def cancel(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed run of a named stage. Use through ``span()``."""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        # True or False for stages with a cache, recorded only when set
+        self.cached = None
+        self._cancelled = False
+        self._peak = 0
+        self._profiler = None
+
+    def cancel(self):
+        # Finish without emitting a record, e.g. for a cache lookup that missed
+        self._cancelled = True
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if _state.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Hand the peak so far to the enclosing span before resetting it
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._start_memory = current
+        stack.append(self)
+
+        if self.name in _state.profile_stages:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._rss_start = _peak_rss_kb()
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.process_time() - self._cpu_start
+        if self._profiler is not None:
+            self._profiler.disable()
+
+        stack = _local.stack
+        stack.pop()
+        record = {
+            'stage': self.name,
+            'start': time.time() - wall,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'pid': os.getpid(),
+            'depth': len(stack),
+        }
+        if self.cached is not None:
+            record['cached'] = self.cached
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+
+        rss_end = _peak_rss_kb()
+        if rss_end is not None:
+            record['peak_rss_kb'] = rss_end
+            record['peak_rss_growth_kb'] = rss_end - self._rss_start
+        if _state.memory and tracemalloc.is_tracing():
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            record['tracemalloc_peak_bytes'] = peak - self._start_memory
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+
+        if self._profiler is not None:
+            _state.profile_dir.mkdir(parents=True, exist_ok=True)
+            profile_path = _state.profile_dir / f'{self.name}.{os.getpid()}.{int(time.time() * 1000)}.prof'
+            self._profiler.dump_stats(profile_path)
+            record['profile'] = str(profile_path)
+
+        if not self._cancelled:
+            _emit(record)
+        return False
+
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+        if _state.trace_path is not None:
+            with open(_state.trace_path, 'a') as handle:
+                handle.write(json.dumps(record) + '\n')
+
+
+def span(name, rows_in=None):
+    """Context manager timing the stage ``name``; set ``.rows_out`` inside it."""
+    if not _state.enabled:
+        return _NULL_SPAN
+    return Span(name, rows_in)
+
+
+def traced(name, rows_in=None):
+    """Decorator running a function as the stage ``name``.
+
+    ``rows_out`` is the length of the return value. ``rows_in``, if given, is
+    called with the function's arguments after it returns.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with Span(name) as stage:
+                result = func(*args, **kwargs)
+                stage.rows_out = row_count(result)
+                if rows_in is not None:
+                    stage.rows_in = rows_in(*args, **kwargs)
+            return result
+        return wrapper
+    return decorate
@@ -0,0 +1,154 @@
+"""Join neighborhood tables on normalized integer keys.
+
+The notebook aligns ``neighborhood_locations_df`` and
+``all_neighborhood_info_df`` with ``pd.concat(axis="columns")`` on their
+string indexes, then drops every row with a gap. Names that differ only in
+case, spacing or punctuation (the census has ``'Bernal Heights '`` where
+the coordinates have ``'Bernal Heights'``) silently disappear.
+
+Here each distinct name is normalized once and assigned an integer ID in a
+shared ``KeyDictionary``. The join then runs on those integer codes, and
+names without a partner on the other side are returned explicitly instead
+of being dropped. Census names that normalize to the same key are merged
+into one neighborhood before the join (``merge_equivalent_names``), so that
+``'Alamo Square'`` and ``'alamo square'`` rows average together.
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from aggregates import KEYS, AggregateCube
+
+
+JoinResult = namedtuple('JoinResult', ['frame', 'unmatched_left', 'unmatched_right'])
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_key(name):
+    """Case-, spacing- and punctuation-insensitive form of a neighborhood name.
+
+    ``'Van Ness/ Civic Center'`` and ``'van ness / civic center'`` both
+    become ``'van ness civic center'``.
+    """
+    name = unicodedata.normalize('NFKC', str(name)).casefold()
+    return _SEPARATORS.sub(' ', name).strip()
+
+
+class KeyDictionary:
+    """Assigns one integer ID to every normalized neighborhood key."""
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def encode(self, names):
+        """Integer IDs of ``names``, adding keys not seen before.
+
+        Each distinct raw name is normalized only once, however many times
+        it repeats in ``names``.
+        """
+        codes, uniques = pd.factorize(pd.Index(names), use_na_sentinel=True)
+        unique_ids = np.empty(len(uniques), dtype=np.int64)
+        for position, name in enumerate(uniques):
+            key = normalize_key(name)
+            if key not in self.ids:
+                self.ids[key] = len(self.keys)
+                self.keys.append(key)
+            unique_ids[position] = self.ids[key]
+        return np.where(codes >= 0, unique_ids[codes], -1)
+
+
+def canonical_names(sizes):
+    """Map every raw name to one representative name of its normalized key.
+
+    ``sizes`` is a row count per raw name; the most frequent spelling of a
+    key represents it, ties going to the first name in sorted order.
+    """
+    names = pd.DataFrame({'name': np.asarray(sizes.index, dtype=object), 'size': sizes.to_numpy()})
+    names['key'] = [normalize_key(name) for name in names['name']]
+    names = names.sort_values(['key', 'size', 'name'], ascending=[True, False, True])
+    representatives = names.groupby('key', sort=False)['name'].transform('first')
+    return dict(zip(names['name'], representatives))
+
+
+def merge_equivalent_names(cube):
+    """The cube with neighborhoods that share a normalized key merged into one.
+
+    Sums, counts and row counts of the merged names add up, so their means
+    are those of all their rows. Returns ``cube`` itself when no two names
+    collide.
+    """
+    names = canonical_names(cube.sizes.groupby(level='neighborhood', observed=True).sum())
+    if all(name == representative for name, representative in names.items()):
+        return cube
+
+    def relabel(frame):
+        index = frame.index
+        neighborhoods = np.asarray(index.get_level_values('neighborhood'), dtype=object)
+        frame = frame.copy()
+        frame.index = pd.MultiIndex.from_arrays(
+            [index.get_level_values('year'), pd.Index(neighborhoods).map(names)], names=KEYS
+        )
+        return frame.groupby(level=KEYS, sort=True).sum()
+
+    return AggregateCube(relabel(cube.sums), relabel(cube.counts), relabel(cube.sizes))
+
+
+def _positions_by_id(ids, names, keys, side):
+    # Row position of every ID on one side; duplicates after normalization are ambiguous
+    positions = np.full(len(keys), -1, dtype=np.int64)
+    valid = ids >= 0
+    counts = np.bincount(ids[valid], minlength=len(keys))
+    if (counts > 1).any():
+        colliding = {
+            keys.keys[i]: sorted(map(str, names[ids == i])) for i in np.flatnonzero(counts > 1)
+        }
+        raise ValueError(f"{side} has several rows for the same normalized neighborhood: {colliding}")
+    positions[ids[valid]] = np.flatnonzero(valid)
+    return positions
+
+
+def join_on_keys(left, right, name='Neighborhood', keys=None):
+    """Inner-join two frames indexed by neighborhood name on normalized keys.
+
+    Returns a ``JoinResult``: ``frame`` holds one row per matched
+    neighborhood, named as in ``left`` and sorted by name, with the columns
+    of ``left`` followed by those of ``right``. ``unmatched_left`` and
+    ``unmatched_right`` hold the rows of either side that found no partner.
+    ``keys`` lets several joins share one ``KeyDictionary``. Raises
+    ``ValueError`` naming the colliding keys if either side has several
+    rows for one normalized name; merge them first.
+    """
+    keys = keys if keys is not None else KeyDictionary()
+    left_ids = keys.encode(left.index)
+    right_ids = keys.encode(right.index)
+    right_positions = _positions_by_id(right_ids, right.index, keys, 'right')
+    # Only checked for ambiguity: the join walks the left rows in order
+    _positions_by_id(left_ids, left.index, keys, 'left')
+
+    partner = np.where(left_ids >= 0, right_positions[np.maximum(left_ids, 0)], -1)
+    matched = partner >= 0
+    left_rows = np.flatnonzero(matched)
+    right_rows = partner[matched]
+
+    frame = pd.concat(
+        [
+            left.iloc[left_rows].reset_index(drop=True),
+            right.iloc[right_rows].reset_index(drop=True),
+        ],
+        axis='columns',
+    )
+    frame.insert(0, name, np.asarray(left.index[left_rows], dtype=object))
+    frame = frame.sort_values(name, ignore_index=True, kind='stable')
+
+    right_matched = np.zeros(len(right), dtype=bool)
+    right_matched[right_rows] = True
+    return JoinResult(frame, left.iloc[~matched], right.iloc[~right_matched])
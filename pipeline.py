@@ -0,0 +1,331 @@
+"""The analysis stages as a DAG, with content-addressed on-disk memoization.
+
+Each stage names the stages whose outputs it takes, the source files it
+reads and the helper modules that do its work. Its cache key is a SHA-256
+over the stage name, a digest of its code, the source digests of its helper
+modules, the pandas and numpy versions, its parameters, the keys of its
+input stages and the content digests of its sources. Editing a source file,
+a stage or one of its helpers therefore invalidates exactly that stage and
+everything downstream of it. A re-run loads the other
+stages' outputs from disk, and does not even load the inputs of a stage
+whose output is found.
+
+Source digests come from the columnar cache manifests (see
+``census_cache.py``), so an unchanged file is not re-hashed. The load
+stages are not written to the stage cache: their memory-mapped columns
+already are one.
+
+Stage outputs are pickled into ``StageCache``, which evicts the least
+recently used entries once it grows past ``max_bytes``.
+
+Every stage that runs, or is loaded from the stage cache, is recorded as an
+instrumentation span (see ``instrumentation.py``) named after its
+``trace_name``, with ``rows_in`` counted over its inputs, ``rows_out`` over
+its output and ``cached`` telling the two apart.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import census_cache
+import census_model
+import neighborhood_join
+
+from aggregates import KEYS, NEIGHBORHOOD_YEAR, PRICE_COLUMNS, add_rent_to_price
+from census_cache import cache_dirs, ensure_cache, file_digest, read_csv_cached, writable
+from census_model import CensusTable
+from instrumentation import row_count, span
+from neighborhood_join import join_on_keys, merge_equivalent_names
+
+
+# Bump to invalidate every entry, e.g. when the pickled layout changes
+PIPELINE_VERSION = 2
+
+# Pickles of one library version may not load, or mean the same, in another
+LIBRARY_VERSIONS = {'pandas': pd.__version__, 'numpy': np.__version__}
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+class Stage:
+    """One node of the DAG: ``func(*input outputs, **params)``."""
+
+    def __init__(self, name, func, inputs=(), sources=(), params=None, persist=True, modules=(),
+                 trace_name=None, rows=row_count):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.sources = tuple(sources)
+        # Helper modules whose code computes the output, beyond func itself
+        self.modules = tuple(modules)
+        self.params = dict(params or {})
+        # Stages that are cheap to recompute or cached elsewhere skip the disk
+        self.persist = persist
+        # Span name in the instrumentation trace, and how its output's rows are counted
+        self.trace_name = trace_name or name
+        self.rows = rows
+
+    def code_digest(self):
+        # Bytecode and constants, so editing the stage function invalidates it
+        code = self.func.__code__
+        digest = hashlib.sha256(code.co_code)
+        digest.update(repr(code.co_consts).encode())
+        digest.update(repr(code.co_names).encode())
+        return digest.hexdigest()
+
+    def module_digests(self):
+        return {module.__name__: module_digest(module) for module in self.modules}
+
+
+@functools.lru_cache(maxsize=None)
+def module_digest(module):
+    # SHA-256 of a module's source file, read once per process
+    with open(inspect.getsourcefile(module), 'rb') as handle:
+        return hashlib.sha256(handle.read()).hexdigest()
+
+
+class StageCache:
+    """Pickled stage outputs in a directory, bounded to ``max_bytes``."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return self.root / f'{key}.pkl'
+
+    def load(self, key):
+        """The output stored under ``key``; raises ``KeyError`` on a miss.
+
+        An entry that cannot be unpickled, for example one written by
+        another pandas version, counts as a miss and is recomputed.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                value = pickle.load(handle)
+        except Exception:
+            raise KeyError(key) from None
+        # The mtime orders entries for eviction
+        os.utime(path)
+        return value
+
+    def store(self, key, value):
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial entry
+        handle, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as out:
+                pickle.dump(value, out, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        # (mtime, size, path) of every entry, least recently used first
+        entries = []
+        for path in self.root.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits ``max_bytes``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self._path(keep):
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            path.unlink(missing_ok=True)
+
+
+class Pipeline:
+    """Evaluates stages by name, memoized in memory and, if given, on disk.
+
+    ``sources`` maps a source name to a zero-argument function returning
+    the content digest of that source. ``computed`` lists the stages that
+    actually ran, in order.
+    """
+
+    def __init__(self, stages, sources, cache=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.sources = sources
+        self.cache = cache
+        self.computed = []
+        self._keys = {}
+        self._digests = {}
+        self._values = {}
+
+    def _digest(self, source):
+        if source not in self._digests:
+            self._digests[source] = self.sources[source]()
+        return self._digests[source]
+
+    def key(self, name):
+        """Cache key of the stage ``name``."""
+        if name not in self._keys:
+            stage = self.stages[name]
+            spec = {
+                'version': PIPELINE_VERSION,
+                'stage': name,
+                'code': stage.code_digest(),
+                'modules': stage.module_digests(),
+                'libraries': LIBRARY_VERSIONS,
+                'params': stage.params,
+                'inputs': [self.key(i) for i in stage.inputs],
+                'sources': [self._digest(s) for s in stage.sources],
+            }
+            payload = json.dumps(spec, sort_keys=True, default=repr).encode()
+            self._keys[name] = hashlib.sha256(payload).hexdigest()
+        return self._keys[name]
+
+    def run(self, name):
+        """Output of the stage ``name``, computing only what is not cached."""
+        if name in self._values:
+            return self._values[name]
+        stage = self.stages[name]
+        persist = self.cache is not None and stage.persist
+        if persist:
+            with span(stage.trace_name) as trace:
+                try:
+                    value = self.cache.load(self.key(name))
+                except KeyError:
+                    trace.cancel()
+                else:
+                    trace.cached = True
+                    trace.rows_out = stage.rows(value)
+                    self._values[name] = value
+                    return value
+
+        # Inputs are resolved first, so their spans do not count towards this one
+        inputs = [self.run(i) for i in stage.inputs]
+        rows_in = [row_count(value) for value in inputs]
+        rows_in = sum(rows_in) if rows_in and None not in rows_in else None
+        with span(stage.trace_name, rows_in) as trace:
+            value = stage.func(*inputs, **stage.params)
+            trace.rows_out = stage.rows(value)
+            if persist:
+                trace.cached = False
+        self.computed.append(name)
+        if persist:
+            try:
+                self.cache.store(self.key(name), value)
+            except OSError:
+                # An unwritable cache only costs a recompute on the next run
+                pass
+        self._values[name] = value
+        return value
+
+
+def _source_digest(path, **read_csv_kwargs):
+    # The columnar cache validates the digest against size and mtime; with
+    # no writable cache the file is hashed directly
+    def digest():
+        try:
+            return ensure_cache(path, **read_csv_kwargs)['sha256']
+        except OSError:
+            return file_digest(path)
+    return digest
+
+
+def default_stage_dir(census_path):
+    # Resources/.cache/stages/, next to the columnar caches, or the user
+    # cache when Resources/ is read-only
+    folders = [cache_dir.parent for cache_dir in cache_dirs(census_path)]
+    folder = next((folder for folder in folders if writable(folder)), folders[-1])
+    return folder / 'stages'
+
+
+def _cube(census):
+    return census.cube()
+
+
+def _by_year(cube):
+    return cube.mean_by('year')
+
+
+def _by_year_neighborhood(cube):
+    return cube.mean_by(KEYS)[PRICE_COLUMNS]
+
+
+def _by_neighborhood(cube):
+    return cube.mean_by('neighborhood')
+
+
+def _by_neighborhood_key(cube):
+    # Like _by_neighborhood, with names that normalize alike merged for the join
+    return merge_equivalent_names(cube).mean_by('neighborhood')
+
+
+def _rent_to_price(cube):
+    return add_rent_to_price(cube.mean_by(NEIGHBORHOOD_YEAR))
+
+
+def housing_pipeline(census_path, coordinates_path, housing_path=None, cache=None):
+    """The notebook's stages as a ``Pipeline`` over the given files.
+
+    Stage names: ``census``, ``coordinates``, ``cube``, ``by_year``,
+    ``by_year_neighborhood``, ``by_neighborhood``, ``by_neighborhood_key``,
+    ``neighborhood_join`` and ``rent_to_price``.
+    """
+    sources = {
+        'census': _source_digest(census_path),
+        'coordinates': _source_digest(coordinates_path),
+    }
+    census_sources = ['census']
+    if housing_path is not None:
+        sources['housing'] = _source_digest(housing_path, header=None, names=['year', 'housing_units'])
+        census_sources.append('housing')
+
+    # The paths stay out of the keys: the sources' content digests stand for them
+    stages = [
+        Stage('census', lambda: CensusTable.load(census_path, housing_path),
+              sources=census_sources, persist=False, modules=[census_model, census_cache],
+              trace_name='load_census'),
+        Stage('coordinates', lambda: read_csv_cached(coordinates_path, index_col='Neighborhood'),
+              sources=['coordinates'], persist=False, modules=[census_cache],
+              trace_name='load_coordinates'),
+        Stage('cube', _cube, inputs=['census'], modules=[census_model, aggregates],
+              trace_name='cube_build'),
+        Stage('by_year', _by_year, inputs=['cube'], modules=[aggregates],
+              trace_name='aggregate_by_year'),
+        Stage('by_year_neighborhood', _by_year_neighborhood, inputs=['cube'], modules=[aggregates],
+              trace_name='aggregate_by_year_neighborhood'),
+        Stage('by_neighborhood', _by_neighborhood, inputs=['cube'], modules=[aggregates],
+              trace_name='aggregate_by_neighborhood'),
+        Stage('by_neighborhood_key', _by_neighborhood_key, inputs=['cube'],
+              modules=[aggregates, neighborhood_join], trace_name='aggregate_by_neighborhood_key'),
+        Stage('neighborhood_join', join_on_keys, inputs=['coordinates', 'by_neighborhood_key'],
+              modules=[neighborhood_join], trace_name='coordinates_join',
+              rows=lambda result: len(result.frame)),
+        Stage('rent_to_price', _rent_to_price, inputs=['cube'], modules=[aggregates]),
+    ]
+    return Pipeline(stages, sources, cache)
@@ -0,0 +1,188 @@
+"""hvPlot figures for the San Francisco housing analysis.
+
+``hvplot.pandas`` pulls in holoviews and bokeh (and GeoViews for the map),
+which takes seconds to import. It is imported the first time a figure is
+built rather than when this module is imported, so code that only needs the
+numbers never pays for the plotting stack.
+"""
+
+
+def load_hvplot():
+    # Importing hvplot.pandas registers the DataFrame.hvplot accessor
+    import hvplot.pandas  # noqa: F401
+
+
+def housing_units_by_year_plot(housing_units_by_year):
+    load_hvplot()
+    return housing_units_by_year.hvplot.bar(
+        x="year",
+        y="housing_units"
+    )
+
+
+def prices_square_foot_by_year_plot(prices_square_foot_by_year):
+    load_hvplot()
+    return prices_square_foot_by_year.hvplot.line(
+        x="year",
+        title="Average Sale Price Per Square Foot and Gross Rent by year",
+        xlabel="Years",
+        ylabel="USD"
+    )
+
+
+def prices_by_year_by_neighborhood_plot(prices_by_year_by_neighborhood):
+    load_hvplot()
+    return prices_by_year_by_neighborhood.hvplot.line(
+        x='year',
+        groupby='neighborhood',
+        title="Average Sale Price Per Square Foot and Gross Rent by Neighborhood",
+        xlabel="Years",
+        ylabel="USD"
+    )
+
+
+def all_neighborhoods_df_plot(all_neighborhoods_df):
+    load_hvplot()
+    return all_neighborhoods_df.hvplot.points(
+        'Lon',
+        'Lat',
+        geo=True,
+        size='sale_price_sqr_foot',
+        color='gross_rent',
+        frame_width=700,
+        frame_height=500,
+        title="Housing data by neighborhood",
+        hover_cols=['Neighborhood']
+    )
+
+
+def prices_by_neighborhood_by_year_plot(prices_by_neighborhood_by_year):
+    load_hvplot()
+    return prices_by_neighborhood_by_year.hvplot.line(
+        x='year',
+        y='rent_to_price',
+        groupby='neighborhood',
+        title="Gross Rent to Sales Price Per Square Foot by Neighborhood",
+        ylabel="Gross Rent to Sales Price Per Square Foot",
+        xlabel="Year"
+    )
+
+
+# Above this many points in view the map is rasterized on the server instead
+# of sending one glyph per point to the browser
+RASTERIZE_THRESHOLD = 50_000
+
+MAP_AGGREGATES = ['weighted', 'mean', 'sum', 'count']
+
+
+def _map_raster(canvas, frame, aggregate, color, weight):
+    # Pixel values of one viewport as an xarray DataArray
+    import datashader as ds
+
+    if aggregate == 'weighted':
+        totals = canvas.points(frame, 'x', 'y', agg=ds.summary(
+            weighted=ds.sum('_weighted'), weight=ds.sum('_weight')
+        ))
+        return (totals['weighted'] / totals['weight'].where(totals['weight'] > 0)).rename(color)
+    if aggregate == 'mean':
+        return canvas.points(frame, 'x', 'y', agg=ds.mean(color))
+    if aggregate == 'sum':
+        return canvas.points(frame, 'x', 'y', agg=ds.sum(weight))
+    return canvas.points(frame, 'x', 'y', agg=ds.count()).rename('count')
+
+
+def neighborhood_map(
+    points_df,
+    color='gross_rent',
+    weight='sale_price_sqr_foot',
+    aggregate='weighted',
+    threshold=RASTERIZE_THRESHOLD,
+    hover_cols=('Neighborhood',),
+):
+    """Geo map of ``points_df`` that stays responsive at millions of points.
+
+    Up to ``threshold`` rows the map is drawn as raw points like
+    ``all_neighborhoods_df_plot``: colored by ``color`` and sized by
+    ``weight``. Above it, the map is a dynamic plot that is redrawn on every
+    zoom or pan. A view with at most ``threshold`` points in range shows
+    them as glyphs again. A view with more is rasterized server-side with
+    Datashader into an image whose pixels aggregate the points under them:
+
+    * ``aggregate='weighted'``: ``sum(color * weight) / sum(weight)`` per
+      pixel, ``color`` averaged with ``weight`` as the weights
+    * ``aggregate='mean'``: unweighted mean of ``color`` per pixel
+    * ``aggregate='sum'``: sum of ``weight`` per pixel, a density weighted
+      by ``weight``
+    * ``aggregate='count'``: number of points per pixel
+
+    Rasterizing needs ``datashader``.
+    """
+    if aggregate not in MAP_AGGREGATES:
+        raise ValueError(f"aggregate must be one of {MAP_AGGREGATES}, not {aggregate!r}")
+    load_hvplot()
+    hover_cols = [c for c in hover_cols if c in points_df.columns]
+    options = dict(
+        frame_width=700,
+        frame_height=500,
+        title="Housing data by neighborhood",
+    )
+    if len(points_df) <= threshold:
+        return points_df.hvplot.points(
+            'Lon',
+            'Lat',
+            geo=True,
+            size=weight,
+            color=color,
+            hover_cols=hover_cols,
+            **options
+        )
+
+    import datashader as ds
+    import holoviews as hv
+    import numpy as np
+    import pandas as pd
+    from datashader.utils import lnglat_to_meters
+    from holoviews.streams import RangeXY
+
+    # Web Mercator coordinates, the projection of the geo=True points map
+    x, y = lnglat_to_meters(points_df['Lon'].to_numpy(), points_df['Lat'].to_numpy())
+    values = points_df[color].to_numpy(dtype=np.float64)
+    weights = points_df[weight].to_numpy(dtype=np.float64)
+    # Only points with both a value and a weight enter the weighted mean
+    weights = np.where(np.isnan(values), np.nan, weights)
+    frame = pd.DataFrame({
+        'x': x, 'y': y, color: values, weight: weights,
+        '_weighted': values * weights, '_weight': weights,
+        **{column: points_df[column].to_numpy() for column in hover_cols},
+    })
+    extent = (x.min(), x.max()), (y.min(), y.max())
+    label = {'weighted': color, 'mean': color, 'sum': weight, 'count': 'count'}[aggregate]
+
+    def view(x_range=None, y_range=None):
+        x_range = x_range or extent[0]
+        y_range = y_range or extent[1]
+        inside = (
+            (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+        )
+        if inside.sum() <= threshold:
+            raster = hv.Image([], kdims=['x', 'y'], vdims=[label])
+            glyphs = frame[inside]
+        else:
+            canvas = ds.Canvas(
+                plot_width=options['frame_width'],
+                plot_height=options['frame_height'],
+                x_range=x_range,
+                y_range=y_range,
+            )
+            raster = hv.Image(_map_raster(canvas, frame, aggregate, color, weight), kdims=['x', 'y'])
+            glyphs = frame.iloc[:0]
+        points = hv.Points(glyphs, kdims=['x', 'y'], vdims=[color, weight] + hover_cols)
+        return raster * points
+
+    return hv.DynamicMap(view, streams=[RangeXY()]).opts(
+        hv.opts.Image(cmap='viridis', colorbar=True, clabel=label, xaxis=None, yaxis=None, **options),
+        hv.opts.Points(
+            color=color, size=np.sqrt(hv.dim(weight)), cmap='viridis', colorbar=True,
+            tools=['hover'], xaxis=None, yaxis=None, **options
+        ),
+    )
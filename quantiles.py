@@ -0,0 +1,249 @@
+"""Mergeable quantile sketches of the prices in every (year, neighborhood) cell.
+
+Means are pulled up by a few luxury sales; medians and percentiles are not.
+Exact percentiles need every group's values sorted in memory, so here each
+(year, neighborhood, metric) cell is summarized by a t-digest instead: a
+few dozen centroids (mean, weight) that are small near the tails and large
+near the median, plus the exact minimum and maximum.
+
+Sketches of separate batches of rows merge into the sketch of all of them,
+like ``AggregateCube``. ``QuantileSketch.from_csv`` builds one in a single
+pass over bounded-size batches, optionally sketching the batches in worker
+processes.
+
+All cells are compressed together. Centroids are sorted by (cell, mean),
+each one's quantile within its cell is mapped through the t-digest scale
+function ``k(q) = compression * (asin(2q - 1) / pi + 1/2)``, and centroids
+that land in the same integer ``k`` bin of their cell are merged. The
+percentiles of every cell come out of one ``np.interp`` over the centroid
+positions. Results are approximate; the error is smallest in the tails.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregates import DEFAULT_CHUNKSIZE, KEYS, PRICE_COLUMNS
+
+
+# Roughly the number of centroids kept per cell
+DEFAULT_COMPRESSION = 100
+
+CELL = KEYS + ['metric']
+
+# Percentiles reported by QuantileSketch.summary
+SUMMARY_QUANTILES = {'p10': 0.1, 'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+
+def _cell_ids(frame):
+    # Dense cell number of every row, in sorted (year, neighborhood, metric) order
+    return frame.groupby(CELL, sort=True, observed=True).ngroup().to_numpy()
+
+
+def _compress(cells, means, weights, compression):
+    # Sort by (cell, mean) and merge neighbors in the same k bin; returns the
+    # row of the first merged centroid of each result plus its mean and weight
+    order = np.lexsort((means, cells))
+    cells, means, weights = cells[order], means[order], weights[order]
+
+    totals = np.bincount(cells, weights=weights)
+    before = np.concatenate([[0.0], np.cumsum(totals)])[cells]
+    q = (np.cumsum(weights) - weights / 2 - before) / totals[cells]
+    bins = np.floor(compression * (np.arcsin(np.clip(2 * q - 1, -1, 1)) / np.pi + 0.5))
+
+    starts = np.flatnonzero(np.r_[True, (np.diff(cells) != 0) | (np.diff(bins) != 0)])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(weights * means, starts) / merged_weights
+    return order[starts], merged_means, merged_weights
+
+
+def compress(centroids, compression=DEFAULT_COMPRESSION):
+    """Merge the centroids of every cell down to about ``compression`` each.
+
+    ``centroids`` has the cell columns plus ``mean`` and ``weight``. Returns
+    them sorted by cell and mean.
+    """
+    rows, means, weights = _compress(
+        _cell_ids(centroids),
+        centroids['mean'].to_numpy(dtype=np.float64),
+        centroids['weight'].to_numpy(dtype=np.float64),
+        compression,
+    )
+    keys = centroids[CELL].iloc[rows].reset_index(drop=True)
+    return keys.assign(mean=means, weight=weights)
+
+
+class QuantileSketch:
+    """t-digest sketches of price metrics for every (year, neighborhood) cell."""
+
+    def __init__(self, centroids, extremes, compression=DEFAULT_COMPRESSION):
+        # Sorted by cell and mean, as returned by compress()
+        self.centroids = centroids
+        # min, max and count of every cell, indexed by (year, neighborhood, metric)
+        self.extremes = extremes
+        self.compression = compression
+
+    @classmethod
+    def empty(cls, compression=DEFAULT_COMPRESSION):
+        centroids = pd.DataFrame({
+            'year': pd.Series([], dtype=np.int64),
+            'neighborhood': pd.Series([], dtype=object),
+            'metric': pd.Series([], dtype=object),
+            'mean': pd.Series([], dtype=np.float64),
+            'weight': pd.Series([], dtype=np.float64),
+        })
+        index = pd.MultiIndex.from_arrays([[], [], []], names=CELL)
+        extremes = pd.DataFrame({'min': [], 'max': [], 'count': []}, index=index)
+        return cls(centroids, extremes, compression)
+
+    @classmethod
+    def from_frame(cls, df, metrics=PRICE_COLUMNS, compression=DEFAULT_COMPRESSION):
+        # Every value starts as its own centroid of weight 1. The (year,
+        # neighborhood) keys are grouped once; cell = key * len(metrics) + metric.
+        metrics = list(metrics)
+        grouped = df.groupby(KEYS, sort=True, observed=True)
+        key_ids = grouped.ngroup().to_numpy()
+        key_index = grouped.size().index
+        cells, values = [], []
+        for position, metric in enumerate(metrics):
+            column = df[metric].to_numpy(dtype=np.float64)
+            present = ~np.isnan(column)
+            cells.append(key_ids[present] * len(metrics) + position)
+            values.append(column[present])
+        cells = np.concatenate(cells)
+        values = np.concatenate(values)
+
+        rows, means, weights = _compress(cells, values, np.ones(len(values)), compression)
+        centroid_cells = cells[rows]
+        counts = np.bincount(cells, minlength=len(key_index) * len(metrics))
+        present = np.flatnonzero(counts)
+        # Merged centroids lose the exact extremes, so keep them per cell
+        extremes = pd.DataFrame({'cell': cells, 'value': values}).groupby('cell')['value']
+
+        def cell_columns(cell_numbers):
+            keys = key_index[cell_numbers // len(metrics)]
+            return {
+                'year': keys.get_level_values('year').to_numpy(),
+                # Plain strings, so cells sort the same in every batch whatever its categories
+                'neighborhood': np.asarray(keys.get_level_values('neighborhood'), dtype=object),
+                'metric': np.asarray(metrics, dtype=object)[cell_numbers % len(metrics)],
+            }
+
+        centroids = pd.DataFrame(cell_columns(centroid_cells)).assign(mean=means, weight=weights)
+        centroids = centroids.sort_values(CELL + ['mean'], ignore_index=True, kind='stable')
+        extremes = pd.DataFrame(
+            {
+                'min': extremes.min().to_numpy(),
+                'max': extremes.max().to_numpy(),
+                'count': counts[present],
+            },
+            index=pd.MultiIndex.from_arrays(list(cell_columns(present).values()), names=CELL),
+        ).sort_index()
+        return cls(centroids, extremes, compression)
+
+    @classmethod
+    def from_batches(cls, batches, metrics=PRICE_COLUMNS, compression=DEFAULT_COMPRESSION, workers=1):
+        """Fold an iterable of DataFrames into one sketch, one batch at a time.
+
+        With ``workers > 1`` the batches are sketched in a process pool,
+        at most two batches per worker in flight, and merged as they finish.
+        """
+        sketch = cls.empty(compression)
+        if workers == 1:
+            for batch in batches:
+                sketch = sketch.merge(cls.from_frame(batch, metrics, compression))
+            return sketch
+
+        pending = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch in batches:
+                pending.append(pool.submit(cls.from_frame, batch, metrics, compression))
+                if len(pending) >= 2 * workers:
+                    sketch = sketch.merge(pending.pop(0).result())
+            for future in pending:
+                sketch = sketch.merge(future.result())
+        return sketch
+
+    @classmethod
+    def from_csv(cls, path, chunksize=DEFAULT_CHUNKSIZE, metrics=PRICE_COLUMNS,
+                 compression=DEFAULT_COMPRESSION, workers=1):
+        # Stream ``path`` in batches of ``chunksize`` rows into a sketch
+        reader = pd.read_csv(path, usecols=KEYS + list(metrics), chunksize=chunksize)
+        with reader:
+            return cls.from_batches(reader, metrics, compression, workers)
+
+    def merge(self, other):
+        # Sketch of the rows of both sketches
+        centroids = pd.concat([self.centroids, other.centroids], ignore_index=True)
+        extremes = pd.concat([self.extremes, other.extremes]).groupby(level=CELL, sort=True)
+        extremes = pd.DataFrame({
+            'min': extremes['min'].min(),
+            'max': extremes['max'].max(),
+            'count': extremes['count'].sum(),
+        })
+        return QuantileSketch(compress(centroids, self.compression), extremes, self.compression)
+
+    def save(self, path):
+        pd.to_pickle(
+            {'centroids': self.centroids, 'extremes': self.extremes, 'compression': self.compression},
+            path,
+        )
+
+    @classmethod
+    def load(cls, path):
+        state = pd.read_pickle(path)
+        return cls(state['centroids'], state['extremes'], state['compression'])
+
+    def __len__(self):
+        # Number of (year, neighborhood, metric) cells
+        return len(self.extremes)
+
+    def quantiles(self, qs):
+        """Estimated ``qs`` quantiles of every cell.
+
+        Returns a DataFrame indexed by ``(year, neighborhood, metric)`` with
+        one column per quantile.
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        centroids = self.centroids
+        extremes = self.extremes
+        cells = extremes.index.get_indexer(pd.MultiIndex.from_frame(centroids[CELL]))
+        weights = centroids['weight'].to_numpy()
+        order = np.lexsort((centroids['mean'].to_numpy(), cells))
+        cells, weights = cells[order], weights[order]
+        totals = np.bincount(cells, weights=weights, minlength=len(extremes))
+        before = np.concatenate([[0.0], np.cumsum(totals)])[cells]
+        positions = (np.cumsum(weights) - weights / 2 - before) / totals[cells]
+
+        # Cell c occupies [2c, 2c + 1] on one axis: its minimum at 2c, its
+        # centroids at their quantile positions, its maximum at 2c + 1
+        n = len(extremes)
+        axis = np.concatenate([2.0 * np.arange(n), 2.0 * cells + positions, 2.0 * np.arange(n) + 1])
+        values = np.concatenate([
+            extremes['min'].to_numpy(dtype=np.float64),
+            centroids['mean'].to_numpy()[order],
+            extremes['max'].to_numpy(dtype=np.float64),
+        ])
+        order = np.argsort(axis, kind='stable')
+        estimates = np.interp(2.0 * np.arange(n)[:, None] + qs[None, :], axis[order], values[order])
+        return pd.DataFrame(estimates, index=extremes.index, columns=list(qs))
+
+    def summary(self):
+        """Median, p10, p25, p75, p90, IQR and count of every metric per cell.
+
+        One row per ``(year, neighborhood)`` with ``<metric>_<stat>``
+        columns, like the mean views of the analysis.
+        """
+        estimates = self.quantiles(list(SUMMARY_QUANTILES.values()))
+        estimates.columns = list(SUMMARY_QUANTILES)
+        estimates['iqr'] = estimates['p75'] - estimates['p25']
+        estimates['count'] = self.extremes['count'].astype(np.int64)
+        wide = estimates.unstack('metric')
+        wide.columns = [f'{metric}_{stat}' for stat, metric in wide.columns]
+        # A metric with no values in a cell has a count of zero
+        for column in wide.columns[wide.columns.str.endswith('_count')]:
+            wide[column] = wide[column].fillna(0).astype(np.int64)
+        metrics = list(dict.fromkeys(self.extremes.index.get_level_values('metric')))
+        stats = list(SUMMARY_QUANTILES) + ['iqr', 'count']
+        return wide[[f'{metric}_{stat}' for metric in metrics for stat in stats]]
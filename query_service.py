@@ -0,0 +1,360 @@
+"""Local HTTP/JSON service over the precomputed neighborhood metrics.
+
+The (year, neighborhood) aggregates, ``all_neighborhoods_df`` and the
+ranking index are computed once when the service starts and then answered
+from in-memory indexes:
+
+* ``GET /point?neighborhood=Anza Vista&year=2012[&metric=...]``
+* ``GET /range?neighborhood=Anza Vista&start=2012&end=2016[&metric=...]``
+* ``GET /top?metric=gross_rent[&k=5][&year=2014][&order=bottom]``
+* ``GET /neighborhood?name=Anza Vista``: the ``all_neighborhoods_df`` row
+* ``GET /neighborhoods`` and ``GET /health``
+* ``POST /reload``: rebuild from the source files now
+
+Neighborhood names are matched on their normalized keys, so case and
+spacing do not matter. Responses are kept in an LRU cache. The source CSVs
+are polled for changes; a refreshed snapshot is built in the background and
+swapped in atomically, together with an empty response cache, so requests
+never see a half-built state::
+
+    python query_service.py --port 8050
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from aggregates import add_rent_to_price
+from neighborhood_join import merge_equivalent_names, normalize_key
+from rankings import RANK_METRICS
+from san_francisco_housing import HousingAnalysis
+
+
+DEFAULT_PORT = 8050
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_POLL_INTERVAL = 5.0
+MAX_K = 1000
+
+POINT_METRICS = ['sale_price_sqr_foot', 'housing_units', 'gross_rent', 'rent_to_price']
+
+
+class QueryError(Exception):
+    """A request that cannot be answered; carries the HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _jsonable(value):
+    # Plain Python values for json.dumps; NaN becomes null
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _records(frame):
+    return [_jsonable(row) for row in frame.to_dict('records')]
+
+
+class Snapshot:
+    """Immutable in-memory indexes over one load of the source data."""
+
+    def __init__(self, analysis, version):
+        self.version = version
+        self.loaded_at = time.time()
+
+        # Names that normalize alike are merged first, so every key has one series
+        cube = merge_equivalent_names(analysis.sfo_data_cube)
+        cells = add_rent_to_price(cube.mean_by(['neighborhood', 'year']))
+        self.names = {}
+        # normalized name -> (sorted years, per-year metric dicts)
+        self.series = {}
+        for neighborhood, rows in cells.groupby(level='neighborhood', sort=True, observed=True):
+            key = normalize_key(neighborhood)
+            self.names[key] = neighborhood
+            rows = rows.droplevel('neighborhood').sort_index()
+            self.series[key] = (
+                [int(year) for year in rows.index],
+                [_jsonable(row) for row in rows[POINT_METRICS].to_dict('records')],
+            )
+
+        self.neighborhood_rows = {
+            normalize_key(row['Neighborhood']): _jsonable(row)
+            for row in analysis.all_neighborhoods_df.to_dict('records')
+        }
+        self.rank_index = analysis.rank_index
+        self.years = sorted({int(year) for years, _ in self.series.values() for year in years})
+
+    def _series(self, params, field='neighborhood'):
+        name = params.get(field)
+        if not name:
+            raise QueryError(400, f"missing {field!r} parameter")
+        key = normalize_key(name)
+        if key not in self.series:
+            raise QueryError(404, f"unknown neighborhood {name!r}")
+        return self.names[key], self.series[key]
+
+    @staticmethod
+    def _metric(params, allowed):
+        metric = params.get('metric')
+        if metric is not None and metric not in allowed:
+            raise QueryError(400, f"metric must be one of {allowed}")
+        return metric
+
+    @staticmethod
+    def _int(params, field, default=None):
+        value = params.get(field)
+        if value is None:
+            if default is None:
+                raise QueryError(400, f"missing {field!r} parameter")
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise QueryError(400, f"{field!r} must be an integer") from None
+
+    def point(self, params):
+        neighborhood, (years, values) = self._series(params)
+        year = self._int(params, 'year')
+        position = bisect.bisect_left(years, year)
+        if position == len(years) or years[position] != year:
+            raise QueryError(404, f"no data for {neighborhood!r} in {year}")
+        metric = self._metric(params, POINT_METRICS)
+        row = values[position]
+        return {
+            'neighborhood': neighborhood,
+            'year': year,
+            **({metric: row[metric]} if metric else row),
+        }
+
+    def range(self, params):
+        neighborhood, (years, values) = self._series(params)
+        start = self._int(params, 'start', years[0])
+        end = self._int(params, 'end', years[-1])
+        metric = self._metric(params, POINT_METRICS)
+        lo = bisect.bisect_left(years, start)
+        hi = bisect.bisect_right(years, end)
+        rows = [
+            {'year': year, **({metric: row[metric]} if metric else row)}
+            for year, row in zip(years[lo:hi], values[lo:hi])
+        ]
+        return {'neighborhood': neighborhood, 'start': start, 'end': end, 'values': rows}
+
+    def top(self, params):
+        metric = params.get('metric')
+        if metric not in RANK_METRICS:
+            raise QueryError(400, f"metric must be one of {RANK_METRICS}")
+        k = self._int(params, 'k', 10)
+        if not 0 < k <= MAX_K:
+            raise QueryError(400, f"k must be between 1 and {MAX_K}")
+        year = params.get('year')
+        year = self._int(params, 'year') if year is not None else None
+        order = params.get('order', 'top')
+        if order not in ('top', 'bottom'):
+            raise QueryError(400, "order must be 'top' or 'bottom'")
+        select = self.rank_index.top if order == 'top' else self.rank_index.bottom
+        try:
+            rows = select(metric, k, year)
+        except KeyError:
+            raise QueryError(404, f"no data for year {year}") from None
+        return {'metric': metric, 'order': order, 'year': year, 'k': k, 'rows': _records(rows)}
+
+    def neighborhood(self, params):
+        name = params.get('name')
+        if not name:
+            raise QueryError(400, "missing 'name' parameter")
+        row = self.neighborhood_rows.get(normalize_key(name))
+        if row is None:
+            raise QueryError(404, f"unknown neighborhood {name!r}")
+        return row
+
+    def neighborhoods(self, params):
+        return {'neighborhoods': sorted(self.names.values())}
+
+
+ROUTES = {
+    '/point': Snapshot.point,
+    '/range': Snapshot.range,
+    '/top': Snapshot.top,
+    '/neighborhood': Snapshot.neighborhood,
+    '/neighborhoods': Snapshot.neighborhoods,
+}
+
+
+class QueryService:
+    """Holds the current snapshot and its response cache; reloads on change."""
+
+    def __init__(self, analysis_factory=HousingAnalysis, cache_size=DEFAULT_CACHE_SIZE):
+        self.analysis_factory = analysis_factory
+        self.cache_size = cache_size
+        self._reload_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._version = 0
+        self._source_stats = None
+        self.reload()
+
+    def _sources(self, analysis):
+        paths = [analysis.census_path, analysis.coordinates_path, analysis.housing_path]
+        return [path for path in paths if path is not None]
+
+    def _stats(self, paths):
+        stats = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stats.append(None)
+            else:
+                stats.append((stat.st_size, stat.st_mtime_ns))
+        return stats
+
+    def reload(self):
+        """Build a fresh snapshot from the sources and swap it in."""
+        with self._reload_lock:
+            analysis = self.analysis_factory()
+            sources = self._sources(analysis)
+            stats = self._stats(sources)
+            snapshot = Snapshot(analysis, self._version + 1)
+            # One assignment replaces snapshot and cache together
+            self._state = (snapshot, OrderedDict())
+            self._version = snapshot.version
+            self._sources_list = sources
+            self._source_stats = stats
+            return snapshot
+
+    def changed(self):
+        return self._stats(self._sources_list) != self._source_stats
+
+    def watch(self, interval=DEFAULT_POLL_INTERVAL):
+        """Poll the source files in a daemon thread and reload when they change."""
+        def poll():
+            while True:
+                time.sleep(interval)
+                if self.changed():
+                    try:
+                        self.reload()
+                    except Exception as exc:  # keep serving the last good snapshot
+                        print(f"reload failed: {type(exc).__name__}: {exc}", file=sys.stderr)
+
+        thread = threading.Thread(target=poll, name='query-service-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def query(self, path, params):
+        """JSON body for ``path`` with query ``params``; raises QueryError."""
+        snapshot, cache = self._state
+        if path == '/health':
+            return json.dumps({
+                'status': 'ok',
+                'version': snapshot.version,
+                'loaded_at': snapshot.loaded_at,
+                'years': snapshot.years,
+            })
+        handler = ROUTES.get(path)
+        if handler is None:
+            raise QueryError(404, f"unknown endpoint {path!r}")
+
+        key = (path, tuple(sorted(params.items())))
+        with self._cache_lock:
+            body = cache.get(key)
+            if body is not None:
+                cache.move_to_end(key)
+                return body
+        body = json.dumps(handler(snapshot, params))
+        with self._cache_lock:
+            cache[key] = body
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return body
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_error(self, exc):
+            # Every failure still gets a JSON response, not a dropped connection
+            status = exc.status if isinstance(exc, QueryError) else 500
+            message = str(exc) if isinstance(exc, QueryError) else f"{type(exc).__name__}: {exc}"
+            self._send(status, json.dumps({'error': message}))
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                body = service.query(url.path, dict(parse_qsl(url.query)))
+            except Exception as exc:
+                self._send_error(exc)
+            else:
+                self._send(200, body)
+
+        def do_POST(self):
+            if urlsplit(self.path).path != '/reload':
+                self._send(404, json.dumps({'error': 'unknown endpoint'}))
+                return
+            try:
+                snapshot = service.reload()
+            except Exception as exc:  # the last good snapshot keeps serving
+                self._send_error(exc)
+            else:
+                self._send(200, json.dumps({'status': 'reloaded', 'version': snapshot.version}))
+
+        def log_message(self, format, *args):
+            # Per-request logging to stderr costs more than answering from memory
+            pass
+
+    return Handler
+
+
+def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the precomputed neighborhood metrics over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between source file checks (0 disables hot reload)")
+    args = parser.parse_args(argv)
+
+    service = QueryService(cache_size=args.cache_size)
+    if args.poll_interval > 0:
+        service.watch(args.poll_interval)
+    server = serve(service, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
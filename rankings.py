@@ -0,0 +1,86 @@
+"""Top-k and bottom-k neighborhood leaderboards.
+
+``RankIndex`` answers "which neighborhoods have the highest (or lowest)
+``gross_rent`` / ``sale_price_sqr_foot`` / ``rent_to_price``", either over
+the whole period or within one year. Each query selects the k extremes with
+``np.argpartition``, which is O(n), and only sorts those k rows. The
+non-null values of every (metric, year) slice are extracted on first use and
+kept for later queries.
+"""
+
+import numpy as np
+
+from aggregates import add_rent_to_price
+
+
+RANK_METRICS = ['gross_rent', 'sale_price_sqr_foot', 'rent_to_price']
+
+
+def select_extremes(values, k, largest=True):
+    """Positions of the ``k`` largest (or smallest) ``values``, best first.
+
+    Ties keep their original order. ``values`` must not contain NaN.
+    """
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    keyed = -values if largest else values
+    if k < len(values):
+        # The k-th best value; everything strictly better is selected, and
+        # ties at the boundary are filled in their original order
+        kth = keyed[np.argpartition(keyed, k - 1)[k - 1]]
+        better = np.flatnonzero(keyed < kth)
+        tied = np.flatnonzero(keyed == kth)[:k - len(better)]
+        candidates = np.sort(np.concatenate([better, tied]))
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(keyed[candidates], kind='stable')]
+
+
+class RankIndex:
+    """Leaderboards over per-neighborhood metrics, overall and per year.
+
+    ``overall`` has one row per neighborhood (for example
+    ``all_neighborhoods_df``). ``by_year``, if given, is indexed by
+    ``(year, neighborhood)`` like ``prices_by_year_by_neighborhood``.
+    A ``rent_to_price`` column is added to either frame when it is missing.
+    """
+
+    def __init__(self, overall, by_year=None):
+        self.overall = self._with_rent_to_price(overall)
+        self.years = {}
+        if by_year is not None:
+            by_year = self._with_rent_to_price(by_year)
+            for year, frame in by_year.groupby(level='year', sort=True):
+                self.years[year] = frame.reset_index()
+        self._slices = {}
+
+    @staticmethod
+    def _with_rent_to_price(frame):
+        if 'rent_to_price' in frame.columns:
+            return frame
+        return add_rent_to_price(frame.copy())
+
+    def _slice(self, metric, year):
+        key = (metric, year)
+        if key not in self._slices:
+            if year is None:
+                frame = self.overall
+            elif year in self.years:
+                frame = self.years[year]
+            else:
+                raise KeyError(f"no data for year {year!r}")
+            values = frame[metric].to_numpy(dtype=np.float64)
+            rows = np.flatnonzero(~np.isnan(values))
+            self._slices[key] = (frame, values[rows], rows)
+        return self._slices[key]
+
+    def top(self, metric, k=1, year=None):
+        """Rows of the ``k`` neighborhoods with the highest ``metric``, highest first."""
+        frame, values, rows = self._slice(metric, year)
+        return frame.iloc[rows[select_extremes(values, k, largest=True)]]
+
+    def bottom(self, metric, k=1, year=None):
+        """Rows of the ``k`` neighborhoods with the lowest ``metric``, lowest first."""
+        frame, values, rows = self._slice(metric, year)
+        return frame.iloc[rows[select_extremes(values, k, largest=False)]]
@@ -1,555 +1,314 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-# # Housing Rental Analysis for San Francisco
-# 
-# In this challenge, your job is to use your data visualization skills, including aggregation, interactive visualizations, and geospatial analysis, to find properties in the San Francisco market that are viable investment opportunities.
-# 
-# ## Instructions
-# 
-# Use the `san_francisco_housing.ipynb` notebook to visualize and analyze the real-estate data.
-# 
-# Note that this assignment requires you to create a visualization by using hvPlot and GeoViews. Additionally, you need to read the `sfo_neighborhoods_census_data.csv` file from the `Resources` folder into the notebook and create the DataFrame that you’ll use in the analysis.
-# 
-# The main task in this Challenge is to visualize and analyze the real-estate data in your Jupyter notebook. Use the `san_francisco_housing.ipynb` notebook to complete the following tasks:
-# 
-# * Calculate and plot the housing units per year.
-# 
-# * Calculate and plot the average prices per square foot.
-# 
-# * Compare the average prices by neighborhood.
-# 
-# * Build an interactive neighborhood map.
-# 
-# * Compose your data story.
-# 
-# ### Calculate and Plot the Housing Units per Year
-# 
-# For this part of the assignment, use numerical and visual aggregation to calculate the number of housing units per year, and then visualize the results as a bar chart. To do so, complete the following steps:
-# 
-# 1. Use the `groupby` function to group the data by year. Aggregate the results by the `mean` of the groups.
-# 
-# 2. Use the `hvplot` function to plot the `housing_units_by_year` DataFrame as a bar chart. Make the x-axis represent the `year` and the y-axis represent the `housing_units`.
-# 
-# 3. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 4. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting bar chart.](Images/zoomed-housing-units-by-year.png)
-# 
-# 5. Answer the following question:
-# 
-#     * What’s the overall trend in housing units over the period that you’re analyzing?
-# 
-# ### Calculate and Plot the Average Sale Prices per Square Foot
-# 
-# For this part of the assignment, use numerical and visual aggregation to calculate the average prices per square foot, and then visualize the results as a bar chart. To do so, complete the following steps:
-# 
-# 1. Group the data by year, and then average the results. What’s the lowest gross rent that’s reported for the years that the DataFrame includes?
-# 
-# 2. Create a new DataFrame named `prices_square_foot_by_year` by filtering out the “housing_units” column. The new DataFrame should include the averages per year for only the sale price per square foot and the gross rent.
-# 
-# 3. Use hvPlot to plot the `prices_square_foot_by_year` DataFrame as a line plot.
-# 
-#     > **Hint** This single plot will include lines for both `sale_price_sqr_foot` and `gross_rent`.
-# 
-# 4. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 5. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting plot.](Images/avg-sale-px-sq-foot-gross-rent.png)
-# 
-# 6. Use both the `prices_square_foot_by_year` DataFrame and interactive plots to answer the following questions:
-# 
-#     * Did any year experience a drop in the average sale price per square foot compared to the previous year?
-# 
-#     * If so, did the gross rent increase or decrease during that year?
-# 
-# ### Compare the Average Sale Prices by Neighborhood
-# 
-# For this part of the assignment, use interactive visualizations and widgets to explore the average sale price per square foot by neighborhood. To do so, complete the following steps:
-# 
-# 1. Create a new DataFrame that groups the original DataFrame by year and neighborhood. Aggregate the results by the `mean` of the groups.
-# 
-# 2. Filter out the “housing_units” column to create a DataFrame that includes only the `sale_price_sqr_foot` and `gross_rent` averages per year.
-# 
-# 3. Create an interactive line plot with hvPlot that visualizes both `sale_price_sqr_foot` and `gross_rent`. Set the x-axis parameter to the year (`x="year"`). Use the `groupby` parameter to create an interactive widget for `neighborhood`.
-# 
-# 4. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 5. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting plot.](Images/pricing-info-by-neighborhood.png)
-# 
-# 6. Use the interactive visualization to answer the following question:
-# 
-#     * For the Anza Vista neighborhood, is the average sale price per square foot for 2016 more or less than the price that’s listed for 2012? 
-# 
-# ### Build an Interactive Neighborhood Map
-# 
-# For this part of the assignment, explore the geospatial relationships in the data by using interactive visualizations with hvPlot and GeoViews. To build your map, use the `sfo_data_df` DataFrame (created during the initial import), which includes the neighborhood location data with the average prices. To do all this, complete the following steps:
-# 
-# 1. Read the `neighborhood_coordinates.csv` file from the `Resources` folder into the notebook, and create a DataFrame named `neighborhood_locations_df`. Be sure to set the `index_col` of the DataFrame as “Neighborhood”.
-# 
-# 2. Using the original `sfo_data_df` Dataframe, create a DataFrame named `all_neighborhood_info_df` that groups the data by neighborhood. Aggregate the results by the `mean` of the group.
-# 
-# 3. Review the two code cells that concatenate the `neighborhood_locations_df` DataFrame with the `all_neighborhood_info_df` DataFrame. Note that the first cell uses the [Pandas concat function](https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.concat.html) to create a DataFrame named `all_neighborhoods_df`. The second cell cleans the data and sets the “Neighborhood” column. Be sure to run these cells to create the `all_neighborhoods_df` DataFrame, which you’ll need to create the geospatial visualization.
-# 
-# 4. Using hvPlot with GeoViews enabled, create a `points` plot for the `all_neighborhoods_df` DataFrame. Be sure to do the following:
-# 
-#     * Set the `geo` parameter to True.
-#     * Set the `size` parameter to “sale_price_sqr_foot”.
-#     * Set the `color` parameter to “gross_rent”.
-#     * Set the `frame_width` parameter to 700.
-#     * Set the `frame_height` parameter to 500.
-#     * Include a descriptive title.
-# 
-# Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of a scatter plot created with hvPlot and GeoViews.](Images/6-4-geoviews-plot.png)
-# 
-# 5. Use the interactive map to answer the following question:
-# 
-#     * Which neighborhood has the highest gross rent, and which has the highest sale price per square foot?
-# 
-# ### Compose Your Data Story
-# 
-# Based on the visualizations that you created, answer the following questions:
-# 
-# * How does the trend in rental income growth compare to the trend in sales prices? Does this same trend hold true for all the neighborhoods across San Francisco?
-# 
-# * What insights can you share with your company about the potential one-click, buy-and-rent strategy that they're pursuing? Do neighborhoods exist that you would suggest for investment, and why?
-
-# In[1]:
-
-
-# Import the required libraries and dependencies
-import pandas as pd
-import hvplot.pandas
+"""Housing Rental Analysis for San Francisco.
+
+The analysis from ``san_francisco_housing.ipynb`` as an importable library.
+Every DataFrame and plot of the notebook is an attribute of
+``HousingAnalysis``, computed on first access and memoized. Nothing is read
+or computed at import time, and hvPlot/GeoViews are only imported when a
+plot attribute is requested (see ``plots.py``). Each stage is wrapped in
+an instrumentation span (see ``instrumentation.py``); the loading and
+aggregation stages get theirs from the pipeline that runs them. With a
+stage cache, those stages are memoized on disk across runs (see
+``pipeline.py``).
+
+The notebook's variable names are also available at module level and
+resolve against a shared default analysis::
+
+    import san_francisco_housing as sfh
+    sfh.prices_by_year_by_neighborhood        # computes the aggregates only
+    sfh.prices_by_year_by_neighborhood_plot   # imports hvplot here
+
+Running the module as a script prints the frames and answers that the
+notebook displays. The narrative and the data-story answers live in the
+notebook.
+"""
+
+import os
+from functools import cached_property
 from pathlib import Path
 
-
-# ## Import the data 
-
-# In[2]:
-
-
-# Using the read_csv function and Path module, create a DataFrame 
-# by importing the sfo_neighborhoods_census_data.csv file from the Resources folder
-sfo_data_df = pd.read_csv(
-    Path("./Resources/sfo_neighborhoods_census_data.csv")
-)
-
-# Review the first and last five rows of the DataFrame
-display(sfo_data_df.head())
-display(sfo_data_df.tail())
-
-
-# ---
-
-# ## Calculate and Plot the Housing Units per Year
-# 
-# For this part of the assignment, use numerical and visual aggregation to calculate the number of housing units per year, and then visualize the results as a bar chart. To do so, complete the following steps:
-# 
-# 1. Use the `groupby` function to group the data by year. Aggregate the results by the `mean` of the groups.
-# 
-# 2. Use the `hvplot` function to plot the `housing_units_by_year` DataFrame as a bar chart. Make the x-axis represent the `year` and the y-axis represent the `housing_units`.
-# 
-# 3. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 4. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting bar chart.](Images/zoomed-housing-units-by-year.png)
-# 
-# 5. Answer the following question:
-# 
-#     * What’s the overall trend in housing units over the period that you’re analyzing?
-# 
-# 
-
-# ### Step 1: Use the `groupby` function to group the data by year. Aggregate the results by the `mean` of the groups.
-
-# In[3]:
-
-
-# Create a numerical aggregation that groups the data by the year and then averages the results.
-housing_units_by_year = sfo_data_df.groupby('year').mean()
-
-# Review the DataFrame
-housing_units_by_year
-
-
-# ### Step 2: Use the `hvplot` function to plot the `housing_units_by_year` DataFrame as a bar chart. Make the x-axis represent the `year` and the y-axis represent the `housing_units`.
-# 
-# ### Step 3: Style and format the line plot to ensure a professionally styled visualization.
-
-# In[4]:
-
-
-# Create a visual aggregation explore the housing units by year
-housing_units_by_year_plot = housing_units_by_year.hvplot.bar(
-    x="year",
-    y="housing_units"
-)
-
-housing_units_by_year_plot
-
-
-# ### Step 5: Answer the following question:
-
-# **Question:** What is the overall trend in housing_units over the period being analyzed?
-# 
-# **Answer:** The trend is slightly positive but only barely so.
-
-# ---
-
-# ## Calculate and Plot the Average Sale Prices per Square Foot
-# 
-# For this part of the assignment, use numerical and visual aggregation to calculate the average prices per square foot, and then visualize the results as a bar chart. To do so, complete the following steps:
-# 
-# 1. Group the data by year, and then average the results. What’s the lowest gross rent that’s reported for the years that the DataFrame includes?
-# 
-# 2. Create a new DataFrame named `prices_square_foot_by_year` by filtering out the “housing_units” column. The new DataFrame should include the averages per year for only the sale price per square foot and the gross rent.
-# 
-# 3. Use hvPlot to plot the `prices_square_foot_by_year` DataFrame as a line plot.
-# 
-#     > **Hint** This single plot will include lines for both `sale_price_sqr_foot` and `gross_rent`.
-# 
-# 4. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 5. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting plot.](Images/avg-sale-px-sq-foot-gross-rent.png)
-# 
-# 6. Use both the `prices_square_foot_by_year` DataFrame and interactive plots to answer the following questions:
-# 
-#     * Did any year experience a drop in the average sale price per square foot compared to the previous year?
-# 
-#     * If so, did the gross rent increase or decrease during that year?
-# 
-# 
-
-# ### Step 1: Group the data by year, and then average the results.
-
-# In[5]:
-
-
-# Create a numerical aggregation by grouping the data by year and averaging the results
-prices_square_foot_by_year = sfo_data_df.groupby('year').mean()
-
-# Review the resulting DataFrame
-prices_square_foot_by_year
-
-
-# **Question:** What is the lowest gross rent reported for the years included in the DataFrame?
-# 
-# **Answer:** The lowest gross rent is 1239 which occurred in 2010.
-
-# ### Step 2: Create a new DataFrame named `prices_square_foot_by_year` by filtering out the “housing_units” column. The new DataFrame should include the averages per year for only the sale price per square foot and the gross rent.
-
-# In[6]:
-
-
-# Filter out the housing_units column, creating a new DataFrame 
-# Keep only sale_price_sqr_foot and gross_rent averages per year
-prices_square_foot_by_year = prices_square_foot_by_year[['sale_price_sqr_foot','gross_rent']]
-
-# Review the DataFrame
-prices_square_foot_by_year
-
-
-# ### Step 3: Use hvPlot to plot the `prices_square_foot_by_year` DataFrame as a line plot.
-# 
-# > **Hint** This single plot will include lines for both `sale_price_sqr_foot` and `gross_rent`
-# 
-# ### Step 4: Style and format the line plot to ensure a professionally styled visualization.
-# 
-
-# In[7]:
-
-
-# Plot prices_square_foot_by_year. 
-# Inclued labels for the x- and y-axes, and a title.
-prices_square_foot_by_year_plot = prices_square_foot_by_year.hvplot.line(
-    x="year",
-    title="Average Sale Price Per Square Foot and Gross Rent by year",
-    xlabel="Years",
-    ylabel="USD"
-)
-
-prices_square_foot_by_year_plot
-
-
-# ### Step 6: Use both the `prices_square_foot_by_year` DataFrame and interactive plots to answer the following questions:
-
-# **Question:** Did any year experience a drop in the average sale price per square foot compared to the previous year?
-# 
-# **Answer:** Yes, 2010 - 2011.
-
-# **Question:** If so, did the gross rent increase or decrease during that year?
-# 
-# **Answer:** It increased.
-
-# ---
-
-# ## Compare the Average Sale Prices by Neighborhood
-# 
-# For this part of the assignment, use interactive visualizations and widgets to explore the average sale price per square foot by neighborhood. To do so, complete the following steps:
-# 
-# 1. Create a new DataFrame that groups the original DataFrame by year and neighborhood. Aggregate the results by the `mean` of the groups.
-# 
-# 2. Filter out the “housing_units” column to create a DataFrame that includes only the `sale_price_sqr_foot` and `gross_rent` averages per year.
-# 
-# 3. Create an interactive line plot with hvPlot that visualizes both `sale_price_sqr_foot` and `gross_rent`. Set the x-axis parameter to the year (`x="year"`). Use the `groupby` parameter to create an interactive widget for `neighborhood`.
-# 
-# 4. Style and format the line plot to ensure a professionally styled visualization.
-# 
-# 5. Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of the resulting plot.](Images/pricing-info-by-neighborhood.png)
-# 
-# 6. Use the interactive visualization to answer the following question:
-# 
-#     * For the Anza Vista neighborhood, is the average sale price per square foot for 2016 more or less than the price that’s listed for 2012? 
-# 
-
-# ### Step 1: Create a new DataFrame that groups the original DataFrame by year and neighborhood. Aggregate the results by the `mean` of the groups.
-
-# In[8]:
-
-
-# Group by year and neighborhood and then create a new dataframe of the mean values
-prices_by_year_by_neighborhood = sfo_data_df.groupby(['year','neighborhood']).mean()
-
-# Review the DataFrame
-prices_by_year_by_neighborhood
-
-
-# ### Step 2: Filter out the “housing_units” column to create a DataFrame that includes only the `sale_price_sqr_foot` and `gross_rent` averages per year.
-
-# In[9]:
-
-
-# Filter out the housing_units
-prices_by_year_by_neighborhood = prices_by_year_by_neighborhood[['sale_price_sqr_foot','gross_rent']]
-
-# Review the first and last five rows of the DataFrame
-display(prices_by_year_by_neighborhood.head())
-display(prices_by_year_by_neighborhood.tail())
-
-
-# ### Step 3: Create an interactive line plot with hvPlot that visualizes both `sale_price_sqr_foot` and `gross_rent`. Set the x-axis parameter to the year (`x="year"`). Use the `groupby` parameter to create an interactive widget for `neighborhood`.
-# 
-# ### Step 4: Style and format the line plot to ensure a professionally styled visualization.
-
-# In[10]:
-
-
-# Use hvplot to create an interactive line plot of the average price per square foot
-# The plot should have a dropdown selector for the neighborhood
-prices_by_year_by_neighborhood_plot = prices_by_year_by_neighborhood.hvplot.line(
-    x='year',
-    groupby='neighborhood',
-    title="Average Sale Price Per Square Foot and Gross Rent by Neighborhood",
-    xlabel="Years",
-    ylabel="USD"
-)
-
-prices_by_year_by_neighborhood_plot
-
-
-# ### Step 6: Use the interactive visualization to answer the following question:
-
-# **Question:** For the Anza Vista neighborhood, is the average sale price per square foot for 2016 more or less than the price that’s listed for 2012? 
-# 
-# **Answer:** The average sale price per square foot for 2016 is less than the price that’s listed for 2012
-
-# ---
-
-# ## Build an Interactive Neighborhood Map
-# 
-# For this part of the assignment, explore the geospatial relationships in the data by using interactive visualizations with hvPlot and GeoViews. To build your map, use the `sfo_data_df` DataFrame (created during the initial import), which includes the neighborhood location data with the average prices. To do all this, complete the following steps:
-# 
-# 1. Read the `neighborhood_coordinates.csv` file from the `Resources` folder into the notebook, and create a DataFrame named `neighborhood_locations_df`. Be sure to set the `index_col` of the DataFrame as “Neighborhood”.
-# 
-# 2. Using the original `sfo_data_df` Dataframe, create a DataFrame named `all_neighborhood_info_df` that groups the data by neighborhood. Aggregate the results by the `mean` of the group.
-# 
-# 3. Review the two code cells that concatenate the `neighborhood_locations_df` DataFrame with the `all_neighborhood_info_df` DataFrame. Note that the first cell uses the [Pandas concat function](https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.concat.html) to create a DataFrame named `all_neighborhoods_df`. The second cell cleans the data and sets the “Neighborhood” column. Be sure to run these cells to create the `all_neighborhoods_df` DataFrame, which you’ll need to create the geospatial visualization.
-# 
-# 4. Using hvPlot with GeoViews enabled, create a `points` plot for the `all_neighborhoods_df` DataFrame. Be sure to do the following:
-# 
-#     * Set the `size` parameter to “sale_price_sqr_foot”.
-# 
-#     * Set the `color` parameter to “gross_rent”.
-# 
-#     * Set the `size_max` parameter to “25”.
-# 
-#     * Set the `zoom` parameter to “11”.
-# 
-# Note that your resulting plot should appear similar to the following image:
-# 
-# ![A screenshot depicts an example of a scatter plot created with hvPlot and GeoViews.](Images/6-4-geoviews-plot.png)
-# 
-# 5. Use the interactive map to answer the following question:
-# 
-#     * Which neighborhood has the highest gross rent, and which has the highest sale price per square foot?
-# 
-
-# ### Step 1: Read the `neighborhood_coordinates.csv` file from the `Resources` folder into the notebook, and create a DataFrame named `neighborhood_locations_df`. Be sure to set the `index_col` of the DataFrame as “Neighborhood”.
-
-# In[11]:
-
-
-# Load neighborhoods coordinates data
-neighborhood_locations_df = pd.read_csv(
-    Path('./Resources/neighborhoods_coordinates.csv'),
-    index_col='Neighborhood'
-)
-
-# Review the DataFrame
-neighborhood_locations_df
-
-
-# ### Step 2: Using the original `sfo_data_df` Dataframe, create a DataFrame named `all_neighborhood_info_df` that groups the data by neighborhood. Aggregate the results by the `mean` of the group.
-
-# In[12]:
-
-
-# Calculate the mean values for each neighborhood
-all_neighborhood_info_df = sfo_data_df.groupby('neighborhood').mean()
-
-# Review the resulting DataFrame
-all_neighborhood_info_df
-
-
-# ### Step 3: Review the two code cells that concatenate the `neighborhood_locations_df` DataFrame with the `all_neighborhood_info_df` DataFrame. 
-# 
-# Note that the first cell uses the [Pandas concat function](https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.concat.html) to create a DataFrame named `all_neighborhoods_df`. 
-# 
-# The second cell cleans the data and sets the “Neighborhood” column. 
-# 
-# Be sure to run these cells to create the `all_neighborhoods_df` DataFrame, which you’ll need to create the geospatial visualization.
-
-# In[13]:
-
-
-# Using the Pandas `concat` function, join the 
-# neighborhood_locations_df and the all_neighborhood_info_df DataFrame
-# The axis of the concatenation is "columns".
-# The concat function will automatially combine columns with
-# identical information, while keeping the additional columns.
-all_neighborhoods_df = pd.concat(
-    [neighborhood_locations_df, all_neighborhood_info_df], 
-    axis="columns",
-    sort=False
-)
-
-# Review the resulting DataFrame
-display(all_neighborhoods_df.head())
-display(all_neighborhoods_df.tail())
-
-
-# In[14]:
-
-
-# Call the dropna function to remove any neighborhoods that do not have data
-all_neighborhoods_df = all_neighborhoods_df.reset_index().dropna()
-
-# Rename the "index" column as "Neighborhood" for use in the Visualization
-all_neighborhoods_df = all_neighborhoods_df.rename(columns={"index": "Neighborhood"})
-
-# Review the resulting DataFrame
-display(all_neighborhoods_df.head())
-display(all_neighborhoods_df.tail())
-
-
-# ### Step 4: Using hvPlot with GeoViews enabled, create a `points` plot for the `all_neighborhoods_df` DataFrame. Be sure to do the following:
-# 
-# * Set the `geo` parameter to True.
-# * Set the `size` parameter to “sale_price_sqr_foot”.
-# * Set the `color` parameter to “gross_rent”.
-# * Set the `frame_width` parameter to 700.
-# * Set the `frame_height` parameter to 500.
-# * Include a descriptive title.
-
-# In[15]:
-
-
-# Create a plot to analyze neighborhood info
-all_neighborhoods_df_plot = all_neighborhoods_df.hvplot.points(
-    'Lon',
-    'Lat',
-    geo=True,
-    size='sale_price_sqr_foot',
-    color='gross_rent',
-    frame_width=700,
-    frame_height=500,
-    title="Housing data by neighborhood",
-    hover_cols=['Neighborhood']
-)
-
-all_neighborhoods_df_plot
-
-
-# ### Step 5: Use the interactive map to answer the following question:
-
-# In[16]:
-
-
-# Print highest Gross Rent
-display(all_neighborhoods_df.sort_values('gross_rent').tail(1))
-
-# Print highest Sale Price Per Square Foot
-display(all_neighborhoods_df.sort_values('sale_price_sqr_foot').tail(1))
-
-
-# **Question:** Which neighborhood has the highest gross rent, and which has the highest sale price per square foot?
-# 
-# **Answer:** 
-# 
-# Although I could make a good guess using the plot I wasn't confident solely using the plot so I added a code cell above to find the corresponding neighborhoods.
-# 
-# Highest Gross Rent = Westwood Park
-# 
-# Highest Sale Price Per Square Foot = Union Square District
-
-# ## Compose Your Data Story
-# 
-# Based on the visualizations that you have created, compose a data story that synthesizes your analysis by answering the following questions:
-
-# In[17]:
-
-
-prices_by_neighborhood_by_year = sfo_data_df.groupby(['neighborhood','year']).mean()
-
-prices_by_neighborhood_by_year['rent_to_price'] = prices_by_neighborhood_by_year['gross_rent'] / prices_by_neighborhood_by_year['sale_price_sqr_foot']
-
-prices_by_neighborhood_by_year_plot = prices_by_neighborhood_by_year.hvplot.line(
-    x='year',
-    y='rent_to_price',
-    groupby='neighborhood',
-    title="Gross Rent to Sales Price Per Square Foot by Neighborhood",
-    ylabel="Gross Rent to Sales Price Per Square Foot",
-    xlabel="Year"
-)
-
-prices_by_neighborhood_by_year_plot
-
-
-# **Question:**  How does the trend in rental income growth compare to the trend in sales prices? Does this same trend hold true for all the neighborhoods across San Francisco?
-# 
-# **Answer:** 
-# 
-# 1: The rental income has increased at a faster pace compared to sales prices given the provided data.
-# 
-# 2: I created the above plot to assist in answering the question. 'Ingleside Heights' is an example neighborhood in which the ratio of gross rent to sales price per square foot has dropped since 2011.
-
-# **Question:** What insights can you share with your company about the potential one-click, buy-and-rent strategy that they're pursuing? Do neighborhoods exist that you would suggest for investment, and why?
-# 
-# **Answer:** I would look at opportunities with the potential for a high gross rent to sales price per square foot ratio. This requires more in-depth knowledge about each neighborhood as there is a limited number of data points provided. However, given the current data we can infer that a consistent growth in rent/price is a good indicator, so a neighborhood like 'Oceanview' would be good to look at for investment.
-
-# In[ ]:
-
-
-
-
+from aggregates import PRICE_COLUMNS
+from instrumentation import configure_from_env, traced
+from pipeline import StageCache, default_stage_dir, housing_pipeline
+from quantiles import QuantileSketch
+from rankings import RankIndex
+from spatial_index import NeighborhoodIndex
+from timeseries import NeighborhoodSeries
+from trends import investment_candidates, trend_table
+from year_over_year import city_prices, divergence_events, year_over_year
+
+
+RESOURCES = Path(__file__).resolve().parent / 'Resources'
+
+# Census rows per batch when building the price sketch
+SKETCH_BATCH_ROWS = 250_000
+
+# Notebook variables exposed lazily at module level
+FRAME_NAMES = [
+    'sfo_data_df',
+    'housing_units_by_year',
+    'prices_square_foot_by_year',
+    'prices_by_year_by_neighborhood',
+    'neighborhood_locations_df',
+    'all_neighborhood_info_df',
+    'all_neighborhoods_df',
+    'prices_by_neighborhood_by_year',
+]
+PLOT_NAMES = [
+    'housing_units_by_year_plot',
+    'prices_square_foot_by_year_plot',
+    'prices_by_year_by_neighborhood_plot',
+    'all_neighborhoods_df_plot',
+    'prices_by_neighborhood_by_year_plot',
+]
+
+
+class HousingAnalysis:
+    """The San Francisco housing analysis, evaluated lazily."""
+
+    def __init__(
+        self,
+        census_path=RESOURCES / 'sfo_neighborhoods_census_data.csv',
+        coordinates_path=RESOURCES / 'neighborhoods_coordinates.csv',
+        housing_path=RESOURCES / 'housing_per_year.csv',
+        stage_cache=None,
+    ):
+        self.census_path = Path(census_path)
+        self.coordinates_path = Path(coordinates_path)
+        # Without housing_per_year.csv the per-year values come from the census rows
+        self.housing_path = Path(housing_path) if housing_path is not None else None
+        # A StageCache, True for the default one next to the sources, or None
+        if stage_cache is True:
+            stage_cache = StageCache(default_stage_dir(self.census_path))
+        self.stage_cache = stage_cache
+
+    @cached_property
+    def pipeline(self):
+        # The loading and aggregation stages as a DAG, see pipeline.py
+        return housing_pipeline(self.census_path, self.coordinates_path, self.housing_path, self.stage_cache)
+
+    # Data
+
+    @cached_property
+    def census(self):
+        # Normalized census table: per-year values stored once, categorical neighborhoods
+        return self.pipeline.run('census')
+
+    @cached_property
+    @traced('widen_census', rows_in=lambda self: len(self.census.facts))
+    def sfo_data_df(self):
+        # The original one-row-per-record layout, rebuilt from the normalized table
+        return self.census.wide()
+
+    @cached_property
+    def sfo_data_cube(self):
+        # (year, neighborhood) sums and counts; every mean below is a rollup of it
+        return self.pipeline.run('cube')
+
+    @cached_property
+    def neighborhood_locations_df(self):
+        return self.pipeline.run('coordinates')
+
+    # Aggregates
+
+    @cached_property
+    def housing_units_by_year(self):
+        return self.pipeline.run('by_year')
+
+    @cached_property
+    def prices_square_foot_by_year(self):
+        return self.housing_units_by_year[PRICE_COLUMNS]
+
+    @cached_property
+    def prices_by_year_by_neighborhood(self):
+        return self.pipeline.run('by_year_neighborhood')
+
+    @cached_property
+    def all_neighborhood_info_df(self):
+        return self.pipeline.run('by_neighborhood')
+
+    @cached_property
+    def neighborhood_join(self):
+        # Coordinates joined to neighborhood means on normalized name keys,
+        # with the names that found no partner on either side
+        return self.pipeline.run('neighborhood_join')
+
+    @cached_property
+    def all_neighborhoods_df(self):
+        return self.neighborhood_join.frame
+
+    @property
+    def unmatched_neighborhoods(self):
+        # (coordinates without census data, census data without coordinates)
+        join = self.neighborhood_join
+        return join.unmatched_left, join.unmatched_right
+
+    @cached_property
+    def prices_by_neighborhood_by_year(self):
+        return self.pipeline.run('rent_to_price')
+
+    @cached_property
+    @traced('neighborhood_series', rows_in=lambda self: len(self.sfo_data_cube))
+    def neighborhood_series(self):
+        # Yearly per-neighborhood price series; monthly feeds use NeighborhoodSeries.from_frame
+        return NeighborhoodSeries.from_cube(self.sfo_data_cube)
+
+    @cached_property
+    @traced('quantile_sketch', rows_in=lambda self: len(self.census))
+    def price_sketch(self):
+        # Mergeable t-digests of sale price and rent per (year, neighborhood),
+        # sketched from bounded census batches, in parallel when there are several
+        batches = -(-len(self.census) // SKETCH_BATCH_ROWS)
+        workers = max(min(os.cpu_count() or 1, batches), 1)
+        return QuantileSketch.from_batches(
+            self.census.batches(SKETCH_BATCH_ROWS, PRICE_COLUMNS), workers=workers
+        )
+
+    @cached_property
+    def price_distributions(self):
+        # Median, p10/p90 and IQR per (year, neighborhood), robust to luxury outliers
+        return self.price_sketch.summary()
+
+    @cached_property
+    @traced('year_over_year')
+    def year_over_year_changes(self):
+        # Deltas, percentage changes and drop flags for every neighborhood and year
+        return year_over_year(self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    @traced('divergence_events')
+    def divergence_events(self):
+        # Neighborhood-years where sale price and gross rent moved in opposite directions
+        return divergence_events(self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    def city_divergence_events(self):
+        # The same screen over the city-wide yearly means
+        return divergence_events(city_prices(self.prices_square_foot_by_year))
+
+    @cached_property
+    @traced('trend_fit')
+    def trends(self):
+        # Linear/log-linear trend and volatility of every neighborhood's metrics
+        return trend_table(self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    @traced('investment_candidates')
+    def investment_candidates(self):
+        # Neighborhoods ranked by steady rent_to_price and rent growth
+        return investment_candidates(self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    @traced('rank_index_build')
+    def rank_index(self):
+        # Top-k / bottom-k leaderboards, overall and per year
+        return RankIndex(self.all_neighborhoods_df, self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    @traced('spatial_index_build')
+    def spatial_index(self):
+        # Nearest-neighborhood lookup for geocoded points
+        return NeighborhoodIndex.from_locations(self.neighborhood_locations_df)
+
+    def simulate_buy_and_rent(self, **options):
+        # Monte Carlo yield/IRR/drawdown distributions; options as simulation.simulate
+        from simulation import simulate
+
+        return simulate(self.prices_by_year_by_neighborhood, **options)
+
+    def highest(self, metric):
+        # Row of all_neighborhoods_df (plus rent_to_price) with the largest `metric`
+        return self.rank_index.top(metric, 1)
+
+    # Plots
+
+    @cached_property
+    @traced('plot:housing_units_by_year_plot')
+    def housing_units_by_year_plot(self):
+        import plots
+        return plots.housing_units_by_year_plot(self.housing_units_by_year)
+
+    @cached_property
+    @traced('plot:prices_square_foot_by_year_plot')
+    def prices_square_foot_by_year_plot(self):
+        import plots
+        return plots.prices_square_foot_by_year_plot(self.prices_square_foot_by_year)
+
+    @cached_property
+    @traced('plot:prices_by_year_by_neighborhood_plot')
+    def prices_by_year_by_neighborhood_plot(self):
+        import plots
+        return plots.prices_by_year_by_neighborhood_plot(self.prices_by_year_by_neighborhood)
+
+    @cached_property
+    @traced('plot:all_neighborhoods_df_plot')
+    def all_neighborhoods_df_plot(self):
+        import plots
+        return plots.all_neighborhoods_df_plot(self.all_neighborhoods_df)
+
+    @cached_property
+    @traced('plot:prices_by_neighborhood_by_year_plot')
+    def prices_by_neighborhood_by_year_plot(self):
+        import plots
+        return plots.prices_by_neighborhood_by_year_plot(self.prices_by_neighborhood_by_year)
+
+    @traced('plot:neighborhood_map')
+    def neighborhood_map(self, points_df=None, **options):
+        # Geo map of points_df (default all_neighborhoods_df), rasterized with
+        # Datashader above plots.RASTERIZE_THRESHOLD points; options as plots.neighborhood_map
+        import plots
+        if points_df is None:
+            points_df = self.all_neighborhoods_df
+        return plots.neighborhood_map(points_df, **options)
+
+
+_default_analysis = None
+
+
+def default_analysis():
+    # Shared analysis over the bundled Resources, created on first use; its
+    # stages are memoized in Resources/.cache/stages/
+    global _default_analysis
+    if _default_analysis is None:
+        _default_analysis = HousingAnalysis(stage_cache=True)
+    return _default_analysis
+
+
+def __getattr__(name):
+    if name in FRAME_NAMES or name in PLOT_NAMES:
+        return getattr(default_analysis(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + FRAME_NAMES + PLOT_NAMES)
+
+
+def main():
+    # SFH_TRACE=<path> writes per-stage timings; see instrumentation.py
+    configure_from_env()
+    analysis = default_analysis()
+    for name in FRAME_NAMES:
+        print(f"# {name}")
+        print(getattr(analysis, name))
+        print()
+
+    locations_only, census_only = analysis.unmatched_neighborhoods
+    print("# Neighborhoods with coordinates but no census data:", list(locations_only.index))
+    print("# Neighborhoods with census data but no coordinates:", list(census_only.index))
+    print()
+
+    print("# Highest gross rent")
+    print(analysis.highest('gross_rent'))
+    print()
+    print("# Highest sale price per square foot")
+    print(analysis.highest('sale_price_sqr_foot'))
+    print()
+    print("# Investment candidates")
+    print(analysis.investment_candidates.head(10)[['rent_to_price_growth', 'gross_rent_growth', 'score', 'rank']])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Monte Carlo simulation of the buy-and-rent strategy in every neighborhood.
+
+For each neighborhood the yearly log changes of ``sale_price_sqr_foot`` and
+``gross_rent`` in ``prices_by_year_by_neighborhood`` give a mean, a
+volatility and a correlation of price and rent growth. Only changes
+between consecutive years that have both metrics are used. Correlated
+growth paths are drawn from that bivariate normal, starting at the
+neighborhood's latest observed price and rent.
+
+The strategy buys a ``unit_sqft`` unit at the starting price, collects
+``12 * gross_rent * (1 - expense_ratio)`` every year and sells at the end
+of the horizon. For every path the simulation computes:
+
+* ``yield``: the mean yearly net rent over the purchase price
+* ``irr``: the internal rate of return of the purchase, rents and sale
+* ``drawdown``: the largest peak-to-trough fall of the unit's value
+
+All paths of a neighborhood are simulated together as arrays, including
+the IRR solve. Neighborhoods are spread over a process pool; each one has
+its own random stream, so results do not depend on the number of
+workers::
+
+    python simulation.py --paths 100000 --horizon 10 --output simulation.csv
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from year_over_year import metric_matrix
+
+
+DEFAULT_PATHS = 10_000
+DEFAULT_HORIZON = 10
+DEFAULT_UNIT_SQFT = 1_000
+DEFAULT_EXPENSE_RATIO = 0.3
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Fewer joint yearly changes than this cannot give a covariance estimate
+MIN_CHANGES = 2
+
+# Paths simulated at once within a neighborhood, to bound memory
+PATH_BATCH = 50_000
+
+IRR_ITERATIONS = 50
+IRR_TOLERANCE = 1e-10
+
+
+def growth_parameters(prices, min_changes=MIN_CHANGES):
+    """Growth distribution and starting values of every neighborhood.
+
+    ``prices`` is indexed by ``(year, neighborhood)``. Returns one row per
+    neighborhood with at least ``min_changes`` consecutive-year changes of
+    both metrics: the mean and standard deviation of the log changes of
+    price and rent, their correlation ``rho``, the number of ``changes``
+    used, and the latest year's ``price`` and ``rent``.
+    """
+    price, neighborhoods, years = metric_matrix(prices, 'sale_price_sqr_foot')
+    rent, _, _ = metric_matrix(prices, 'gross_rent')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_changes = np.diff(np.log(np.where(price > 0, price, np.nan)), axis=1)
+        rent_changes = np.diff(np.log(np.where(rent > 0, rent, np.nan)), axis=1)
+    joint = ~np.isnan(price_changes) & ~np.isnan(rent_changes)
+    count = joint.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_mu = np.where(joint, price_changes, 0).sum(axis=1) / count
+        rent_mu = np.where(joint, rent_changes, 0).sum(axis=1) / count
+        dp = np.where(joint, price_changes - price_mu[:, None], 0)
+        dr = np.where(joint, rent_changes - rent_mu[:, None], 0)
+        price_var = (dp * dp).sum(axis=1) / (count - 1)
+        rent_var = (dr * dr).sum(axis=1) / (count - 1)
+        covariance = (dp * dr).sum(axis=1) / (count - 1)
+        rho = np.clip(covariance / np.sqrt(price_var * rent_var), -1, 1)
+    rho = np.where(np.isfinite(rho), rho, 0.0)
+
+    # Starting point: the latest year with both a price and a rent
+    both = ~np.isnan(price) & ~np.isnan(rent)
+    last = both.shape[1] - 1 - np.argmax(both[:, ::-1], axis=1)
+    rows = np.arange(len(neighborhoods))
+
+    params = pd.DataFrame({
+        'price_mu': price_mu,
+        'price_sigma': np.sqrt(price_var),
+        'rent_mu': rent_mu,
+        'rent_sigma': np.sqrt(rent_var),
+        'rho': rho,
+        'changes': count,
+        'start_year': years.to_numpy()[last],
+        'price': price[rows, last],
+        'rent': rent[rows, last],
+    }, index=neighborhoods)
+    return params[(count >= min_changes) & both.any(axis=1)]
+
+
+def _irr(outlay, inflows):
+    # Vectorized IRR: solve -outlay + sum_t inflows[:, t-1] * v**t = 0 for the
+    # discount factor v = 1 / (1 + irr). With positive inflows the polynomial is
+    # increasing and convex in v > 0, so Newton's method converges from any
+    # v > 0. Starting from the rate that grows the outlay into the total inflow
+    # over the inflows' mean timing saves a few iterations.
+    total = inflows.sum(axis=1)
+    timing = inflows @ np.arange(1, inflows.shape[1] + 1) / total
+    v = (outlay / total) ** (1 / timing)
+    coefficients = inflows[:, ::-1].T.copy()
+    value = np.empty_like(v)
+    slope = np.empty_like(v)
+    for _ in range(IRR_ITERATIONS):
+        # Horner's rule for the polynomial and its derivative together
+        value[:] = 0
+        slope[:] = 0
+        for coefficient in coefficients:
+            slope *= v
+            slope += value
+            value *= v
+            value += coefficient
+        slope *= v
+        slope += value
+        value *= v
+        value -= outlay
+        step = np.divide(value, slope, out=value)
+        v -= step
+        if np.abs(step).max() < IRR_TOLERANCE:
+            break
+    return 1 / v - 1
+
+
+def simulate_paths(params, paths, horizon, rng, unit_sqft=DEFAULT_UNIT_SQFT,
+                   expense_ratio=DEFAULT_EXPENSE_RATIO):
+    """Yield, IRR and drawdown arrays of ``paths`` paths for one neighborhood.
+
+    ``params`` is one row of ``growth_parameters`` as a mapping.
+    """
+    shocks = rng.standard_normal((2, paths, horizon))
+    price_growth = params['price_mu'] + params['price_sigma'] * shocks[0]
+    rent_growth = params['rent_mu'] + params['rent_sigma'] * (
+        params['rho'] * shocks[0] + np.sqrt(1 - params['rho'] ** 2) * shocks[1]
+    )
+
+    outlay = params['price'] * unit_sqft
+    value = outlay * np.exp(np.cumsum(price_growth, axis=1))
+    net_rent = 12 * params['rent'] * (1 - expense_ratio) * np.exp(np.cumsum(rent_growth, axis=1))
+
+    inflows = net_rent.copy()
+    inflows[:, -1] += value[:, -1]
+
+    peak = np.maximum(np.maximum.accumulate(value, axis=1), outlay)
+    return {
+        'yield': net_rent.mean(axis=1) / outlay,
+        'irr': _irr(outlay, inflows),
+        'drawdown': (1 - value / peak).max(axis=1),
+    }
+
+
+def _summarize(results, percentiles):
+    summary = {}
+    for name, values in results.items():
+        for q, value in zip(percentiles, np.percentile(values, percentiles)):
+            summary[f'{name}_p{q}'] = value
+    summary['yield_mean'] = results['yield'].mean()
+    summary['irr_mean'] = results['irr'].mean()
+    summary['loss_probability'] = (results['irr'] < 0).mean()
+    return summary
+
+
+def _simulate_chunk(records, seeds, paths, horizon, unit_sqft, expense_ratio, percentiles):
+    # Worker: summaries of a chunk of neighborhoods, one random stream each
+    summaries = []
+    for params, seed in zip(records, seeds):
+        rng = np.random.default_rng(seed)
+        batches = []
+        for start in range(0, paths, PATH_BATCH):
+            batch = min(PATH_BATCH, paths - start)
+            batches.append(simulate_paths(params, batch, horizon, rng, unit_sqft, expense_ratio))
+        results = {name: np.concatenate([b[name] for b in batches]) for name in batches[0]}
+        summaries.append(_summarize(results, percentiles))
+    return summaries
+
+
+def simulate(prices, paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON, unit_sqft=DEFAULT_UNIT_SQFT,
+             expense_ratio=DEFAULT_EXPENSE_RATIO, percentiles=PERCENTILES, seed=0, workers=None):
+    """Return distributions of the buy-and-rent strategy for every neighborhood.
+
+    Returns one row per neighborhood: the ``growth_parameters`` followed
+    by percentiles of ``yield``, ``irr`` and ``drawdown``, the mean yield
+    and IRR, and the probability of a negative IRR. ``workers=1`` runs in
+    this process; the default uses every core.
+    """
+    params = growth_parameters(prices)
+    records = params.to_dict('records')
+    seeds = np.random.SeedSequence(seed).spawn(len(records))
+    workers = min(workers or os.cpu_count() or 1, max(len(records), 1))
+    options = (paths, horizon, unit_sqft, expense_ratio, list(percentiles))
+
+    if workers == 1:
+        summaries = _simulate_chunk(records, seeds, *options)
+    else:
+        # A few chunks per worker keeps the pool busy when neighborhoods differ in cost
+        bounds = np.linspace(0, len(records), workers * 4 + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_simulate_chunk, records[lo:hi], seeds[lo:hi], *options)
+                for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+            ]
+            summaries = [summary for future in futures for summary in future.result()]
+    return params.join(pd.DataFrame(summaries, index=params.index))
+
+
+def main(argv=None):
+    from san_francisco_housing import default_analysis
+
+    parser = argparse.ArgumentParser(description="Simulate the buy-and-rent strategy in every neighborhood.")
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS)
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="holding period in years")
+    parser.add_argument('--unit-sqft', type=float, default=DEFAULT_UNIT_SQFT)
+    parser.add_argument('--expense-ratio', type=float, default=DEFAULT_EXPENSE_RATIO)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--output', help="CSV file for the full table")
+    args = parser.parse_args(argv)
+
+    table = simulate(
+        default_analysis().prices_by_year_by_neighborhood,
+        paths=args.paths,
+        horizon=args.horizon,
+        unit_sqft=args.unit_sqft,
+        expense_ratio=args.expense_ratio,
+        seed=args.seed,
+        workers=args.workers,
+    )
+    if args.output:
+        table.to_csv(args.output)
+    columns = ['yield_p50', 'irr_p5', 'irr_p50', 'irr_p95', 'drawdown_p50', 'loss_probability']
+    print(table.sort_values('irr_p50', ascending=False)[columns].to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Nearest-neighborhood lookup for batches of geocoded points.
+
+``NeighborhoodIndex`` is built from ``neighborhood_locations_df`` (one
+``Lat``/``Lon`` centroid per neighborhood) and assigns arrays of listing
+coordinates to their nearest centroid in one vectorized call.
+
+Coordinates are projected onto a local equirectangular plane centred on the
+centroids, which is accurate at city scale. Queries go through a
+``scipy.spatial.cKDTree`` when SciPy is installed. Without SciPy they fall
+back to a blocked brute-force search: each block of points is compared with
+every centroid in a single array operation, which is fast for the few
+hundred centroids a city has. Reported distances are great-circle
+kilometres to the chosen centroid.
+
+Several neighborhoods can share one centroid (31 of the 73 rows of
+``neighborhoods_coordinates.csv`` repeat another row's ``Lat``/``Lon``).
+Coincident centroids are collapsed when the index is built and a point
+nearest to them is assigned the lowest code among them, so both search
+paths return the same neighborhood. ``coincident`` lists the groups.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Points per block in the brute-force search; bounds the distance matrix
+DEFAULT_BLOCK_SIZE = 65_536
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Great-circle distance in kilometres, broadcasting over arrays
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class NeighborhoodIndex:
+    """Spatial index over neighborhood centroids."""
+
+    def __init__(self, names, lat, lon, block_size=DEFAULT_BLOCK_SIZE):
+        self.names = pd.Index(names)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        if len(self.names) == 0:
+            raise ValueError("cannot build a spatial index without any neighborhoods")
+        self.block_size = block_size
+        # Local projection: scale longitude by cos(latitude) at the centre
+        self._lon_scale = np.cos(np.radians(self.lat.mean()))
+        # Search over distinct centroids only; np.unique's first index of each
+        # location is the lowest code sharing it
+        self._points, self._codes, location = np.unique(
+            self._project(self.lat, self.lon), axis=0, return_index=True, return_inverse=True
+        )
+        location = location.ravel()
+        self.coincident = [
+            self.names[np.flatnonzero(location == shared)].tolist()
+            for shared in np.flatnonzero(np.bincount(location) > 1)
+        ]
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            self._tree = None
+        else:
+            self._tree = cKDTree(self._points)
+
+    @classmethod
+    def from_locations(cls, neighborhood_locations_df, **kwargs):
+        # Rows with missing coordinates cannot be indexed
+        locations = neighborhood_locations_df.dropna(subset=['Lat', 'Lon'])
+        return cls(locations.index, locations['Lat'], locations['Lon'], **kwargs)
+
+    def _project(self, lat, lon):
+        return np.column_stack([lat, lon * self._lon_scale])
+
+    def _nearest_brute_force(self, points):
+        codes = np.empty(len(points), dtype=np.intp)
+        # Squared differences per axis, as the KD-tree computes them, so
+        # near-ties resolve the same way on both paths
+        lat, lon = self._points.T
+        for start in range(0, len(points), self.block_size):
+            block = points[start:start + self.block_size]
+            distances = (block[:, :1] - lat) ** 2 + (block[:, 1:] - lon) ** 2
+            codes[start:start + len(block)] = distances.argmin(axis=1)
+        return codes
+
+    def query(self, lat, lon):
+        """Nearest neighborhood of every point.
+
+        Returns ``(codes, distances_km)``: positions into ``self.names`` and
+        great-circle distances to those centroids. Points with a missing
+        coordinate get code ``-1`` and distance NaN.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        codes = np.full(lat.shape, -1, dtype=np.intp)
+        distances = np.full(lat.shape, np.nan)
+
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        points = self._project(lat[valid], lon[valid])
+        if self._tree is not None:
+            _, found = self._tree.query(points)
+        else:
+            found = self._nearest_brute_force(points)
+        found = self._codes[found]
+        codes[valid] = found
+        distances[valid] = haversine_km(lat[valid], lon[valid], self.lat[found], self.lon[found])
+        return codes, distances
+
+    def attach_metrics(self, lat, lon, metrics):
+        """Nearest neighborhood of every point, joined to its metrics.
+
+        ``metrics`` is indexed by neighborhood name (for example
+        ``all_neighborhoods_df.set_index('Neighborhood')``). Neighborhoods
+        without metrics get NaN.
+        """
+        codes, distances = self.query(lat, lon)
+        names = self.names.take(np.where(codes >= 0, codes, 0))
+        result = pd.DataFrame({
+            'neighborhood': np.where(codes >= 0, names, None),
+            'distance_km': distances,
+        })
+        # One metrics row per centroid plus an all-NaN row for missing points,
+        # then a single positional take per point
+        lookup = metrics.reindex(self.names).reset_index(drop=True)
+        lookup.loc[len(lookup)] = np.nan
+        attached = lookup.iloc[np.where(codes >= 0, codes, len(self.names))]
+        return pd.concat([result, attached.reset_index(drop=True)], axis='columns')
@@ -0,0 +1,100 @@
+"""Synthetic census-shaped data for benchmarks and load tests.
+
+Generates rows with the columns of ``sfo_neighborhoods_census_data.csv``
+(``year, neighborhood, sale_price_sqr_foot, housing_units, gross_rent``) for
+any number of rows and neighborhoods, plus a matching coordinates table.
+As in the real data, ``housing_units`` and ``gross_rent`` hold one
+city-wide value per year. Large files are written in chunks, so
+``write_census_csv`` can produce 10^8 rows without holding them in memory.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+YEARS = np.arange(2010, 2017)
+
+# Rows generated per chunk when writing CSVs
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def neighborhood_names(count):
+    width = len(str(max(count - 1, 0)))
+    return np.array([f"Neighborhood {i:0{width}d}" for i in range(count)], dtype=object)
+
+
+def _year_values(years):
+    # City-wide values that grow steadily over the years, like the census
+    offset = years - YEARS[0]
+    housing_units = 372560 + 1947 * offset
+    gross_rent = np.round(1239 * 1.2 ** offset).astype(np.int64)
+    return housing_units, gross_rent
+
+
+def generate_census(rows, neighborhoods, years=YEARS, seed=0):
+    """DataFrame of ``rows`` census records over ``neighborhoods`` neighborhoods."""
+    rng = np.random.default_rng(seed)
+    return _census_chunk(rng, rows, neighborhood_names(neighborhoods), np.asarray(years))
+
+
+def _census_chunk(rng, rows, names, years):
+    year = rng.choice(years, size=rows)
+    codes = rng.integers(0, len(names), size=rows)
+    # Each neighborhood has its own price level; prices drift up over time
+    base_price = 150 + (np.arange(len(names)) * 7919 % 600)
+    price = base_price[codes] * 1.08 ** (year - years[0]) * rng.lognormal(0, 0.25, size=rows)
+    housing_units, gross_rent = _year_values(year)
+    return pd.DataFrame({
+        'year': year,
+        'neighborhood': names[codes],
+        'sale_price_sqr_foot': price,
+        'housing_units': housing_units,
+        'gross_rent': gross_rent,
+    })
+
+
+def generate_monthly_census(rows, neighborhoods, years=YEARS, seed=0):
+    """Census records with a ``month`` column, like a monthly feed.
+
+    Prices also drift within the year, so monthly and quarterly views differ.
+    """
+    rng = np.random.default_rng(seed)
+    df = _census_chunk(rng, rows, neighborhood_names(neighborhoods), np.asarray(years))
+    month = rng.integers(1, 13, size=rows)
+    df.insert(1, 'month', month)
+    df['sale_price_sqr_foot'] *= 1.08 ** ((month - 1) / 12)
+    return df
+
+
+def write_census_csv(path, rows, neighborhoods, years=YEARS, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write ``rows`` synthetic census records to ``path`` in bounded chunks."""
+    rng = np.random.default_rng(seed)
+    names = neighborhood_names(neighborhoods)
+    years = np.asarray(years)
+    with open(path, 'w', newline='') as handle:
+        written = 0
+        while written < rows:
+            size = min(chunk_rows, rows - written)
+            _census_chunk(rng, size, names, years).to_csv(handle, header=written == 0, index=False)
+            written += size
+    return path
+
+
+def generate_coordinates(neighborhoods, seed=0):
+    """Coordinates table shaped like ``neighborhoods_coordinates.csv``."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Neighborhood': neighborhood_names(neighborhoods),
+        'Lat': rng.uniform(37.70, 37.81, size=neighborhoods),
+        'Lon': rng.uniform(-122.51, -122.38, size=neighborhoods),
+    })
+
+
+def write_housing_per_year_csv(path, years=YEARS):
+    # Headerless (year, housing_units) file like housing_per_year.csv
+    years = np.asarray(years)
+    housing_units, _ = _year_values(years)
+    pd.DataFrame({'year': years, 'housing_units': housing_units}).to_csv(
+        path, header=False, index=False
+    )
+    return path
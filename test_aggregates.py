@@ -0,0 +1,90 @@
+"""The cube rollups against the notebook's ``groupby().mean()`` frames.
+
+Run with ``python -m pytest``. The baseline frames are built from
+``Resources/`` exactly as in ``san_francisco_housing.ipynb``.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import KEYS, METRICS, PRICE_COLUMNS, AggregateCube, summary_frames
+from san_francisco_housing import HousingAnalysis
+
+
+CENSUS_PATH = Path(__file__).resolve().parent / 'Resources' / 'sfo_neighborhoods_census_data.csv'
+
+
+def plain(frame):
+    # Object-typed neighborhood levels and float columns, so only values are compared
+    frame = frame.astype(np.float64)
+    if isinstance(frame.index, pd.MultiIndex):
+        levels = [
+            level.astype(object) if level.name == 'neighborhood' else level
+            for level in frame.index.levels
+        ]
+        frame.index = frame.index.set_levels(levels)
+    elif frame.index.name == 'neighborhood':
+        frame.index = frame.index.astype(object)
+    return frame
+
+
+@pytest.fixture(scope='module')
+def sfo_data_df():
+    return pd.read_csv(CENSUS_PATH)
+
+
+@pytest.fixture(scope='module')
+def baseline(sfo_data_df):
+    numeric = sfo_data_df[KEYS + METRICS]
+    return {
+        'year': numeric.drop(columns='neighborhood').groupby('year').mean(),
+        'neighborhood': numeric.groupby('neighborhood').mean(),
+        'year_neighborhood': numeric.groupby(KEYS).mean(),
+        'neighborhood_year': numeric.groupby(['neighborhood', 'year']).mean(),
+    }
+
+
+@pytest.mark.parametrize('levels, name', [
+    ('year', 'year'),
+    ('neighborhood', 'neighborhood'),
+    (KEYS, 'year_neighborhood'),
+    (['neighborhood', 'year'], 'neighborhood_year'),
+])
+def test_mean_by_matches_groupby_mean(sfo_data_df, baseline, levels, name):
+    cube = AggregateCube.from_frame(sfo_data_df)
+    pd.testing.assert_frame_equal(plain(cube.mean_by(levels)), plain(baseline[name]))
+
+
+def test_summary_frames_from_streamed_csv(baseline):
+    # A small chunk size splits every year over several batches
+    frames = summary_frames(AggregateCube.from_csv(CENSUS_PATH, chunksize=37))
+    pd.testing.assert_frame_equal(plain(frames['housing_units_by_year']), plain(baseline['year']))
+    pd.testing.assert_frame_equal(
+        plain(frames['prices_square_foot_by_year']), plain(baseline['year'][PRICE_COLUMNS])
+    )
+    pd.testing.assert_frame_equal(
+        plain(frames['prices_by_year_by_neighborhood']),
+        plain(baseline['year_neighborhood'][PRICE_COLUMNS]),
+    )
+
+
+def test_analysis_frames_match_notebook(baseline):
+    # The census table stores prices as float32, hence the tolerance
+    analysis = HousingAnalysis()
+    pd.testing.assert_frame_equal(plain(analysis.housing_units_by_year), plain(baseline['year']))
+    pd.testing.assert_frame_equal(
+        plain(analysis.prices_by_year_by_neighborhood),
+        plain(baseline['year_neighborhood'][PRICE_COLUMNS]),
+        rtol=1e-6,
+    )
+    pd.testing.assert_frame_equal(
+        plain(analysis.all_neighborhood_info_df), plain(baseline['neighborhood']), rtol=1e-6
+    )
+    expected = baseline['neighborhood_year'].copy()
+    expected['rent_to_price'] = expected['gross_rent'] / expected['sale_price_sqr_foot']
+    pd.testing.assert_frame_equal(
+        plain(analysis.prices_by_neighborhood_by_year), plain(expected), rtol=1e-6
+    )
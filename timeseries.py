@@ -0,0 +1,191 @@
+"""Monthly, quarterly and yearly neighborhood series in contiguous arrays.
+
+``NeighborhoodSeries`` keeps per-period sums and non-null counts of the
+metrics in two ``(neighborhood, period, metric)`` arrays, over one unbroken
+``PeriodIndex``. Each neighborhood's series is a contiguous block, and a
+period without data is simply a zero count. Means are ``sums / counts``.
+
+Because sums and counts add up, coarser views are exact rollups of finer
+ones:
+
+* ``resample('Q')`` / ``resample('Y')`` reduce runs of consecutive periods
+  with one ``np.add.reduceat`` along the period axis
+* ``rolling(window)`` takes differences of running sums, so every window
+  of every neighborhood costs the same few array operations
+
+The yearly views of the analysis are then resamples of the monthly series
+rather than new scans of a table twelve times as long::
+
+    monthly = NeighborhoodSeries.from_frame(feed, freq='M')
+    monthly.resample('Y').to_frame()   # like prices_by_year_by_neighborhood
+    monthly.resample('Q').rolling(4).to_frame()
+"""
+
+import numpy as np
+import pandas as pd
+
+from aggregates import PRICE_COLUMNS
+
+
+# Coarsest last; a series can only be resampled to a later entry
+FREQUENCIES = ['M', 'Q', 'Y']
+
+# Periods per year, to build ordinals from year/month/quarter columns
+_PER_YEAR = {'M': 12, 'Q': 4, 'Y': 1}
+_SUBPERIOD = {'M': 'month', 'Q': 'quarter'}
+
+
+def _period_ordinals(df, freq):
+    # Pandas period ordinals of every row: from a ``period`` column if there is
+    # one, otherwise from ``year`` plus ``month`` or ``quarter``
+    if 'period' in df.columns:
+        return pd.PeriodIndex(df['period'], freq=freq).asi8
+    ordinals = (df['year'].to_numpy(dtype=np.int64) - 1970) * _PER_YEAR[freq]
+    if freq != 'Y':
+        ordinals = ordinals + df[_SUBPERIOD[freq]].to_numpy(dtype=np.int64) - 1
+    return ordinals
+
+
+class NeighborhoodSeries:
+    """Per-(neighborhood, period) sums and counts of metrics at one frequency."""
+
+    def __init__(self, neighborhoods, periods, metrics, sums, counts):
+        self.neighborhoods = pd.Index(neighborhoods, name='neighborhood')
+        self.periods = periods
+        self.metrics = list(metrics)
+        # Shape (neighborhood, period, metric), C order
+        self.sums = sums
+        self.counts = counts
+
+    @property
+    def freq(self):
+        # 'M', 'Q' or 'Y'; pandas names yearly periods 'A-DEC'
+        freq = self.periods.freqstr[0]
+        return 'Y' if freq == 'A' else freq
+
+    @classmethod
+    def from_frame(cls, df, freq='M', metrics=PRICE_COLUMNS):
+        """Series of the rows of ``df`` at frequency ``freq``.
+
+        ``df`` has ``neighborhood`` and the metric columns, and either a
+        ``period`` column or ``year`` plus ``month`` (for ``'M'``) or
+        ``quarter`` (for ``'Q'``).
+        """
+        metrics = list(metrics)
+        ordinals = _period_ordinals(df, freq)
+        first = ordinals.min()
+        offsets = ordinals - first
+        periods = pd.period_range(pd.Period(ordinal=first, freq=freq), periods=offsets.max() + 1)
+
+        codes, neighborhoods = pd.factorize(df['neighborhood'], sort=True)
+        cells = codes * len(periods) + offsets
+        size = len(neighborhoods) * len(periods)
+        shape = (len(neighborhoods), len(periods), len(metrics))
+        sums = np.empty(shape)
+        counts = np.empty(shape, dtype=np.int64)
+        for position, metric in enumerate(metrics):
+            values = df[metric].to_numpy(dtype=np.float64)
+            present = ~np.isnan(values)
+            sums[:, :, position] = np.bincount(
+                cells[present], weights=values[present], minlength=size
+            ).reshape(shape[:2])
+            counts[:, :, position] = np.bincount(cells[present], minlength=size).reshape(shape[:2])
+        return cls(np.asarray(neighborhoods, dtype=object), periods, metrics, sums, counts)
+
+    @classmethod
+    def from_cube(cls, cube, metrics=PRICE_COLUMNS):
+        # Yearly series from the (year, neighborhood) sums and counts of an AggregateCube
+        metrics = list(metrics)
+        index = cube.sums.index
+        years = index.get_level_values('year').to_numpy(dtype=np.int64)
+        codes, neighborhoods = pd.factorize(
+            np.asarray(index.get_level_values('neighborhood'), dtype=object), sort=True
+        )
+        periods = pd.period_range(str(years.min()), str(years.max()), freq='Y')
+        shape = (len(neighborhoods), len(periods), len(metrics))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        sums[codes, years - years.min()] = cube.sums[metrics].to_numpy(dtype=np.float64)
+        counts[codes, years - years.min()] = cube.counts[metrics].to_numpy(dtype=np.int64)
+        return cls(neighborhoods, periods, metrics, sums, counts)
+
+    def __len__(self):
+        # Number of neighborhoods
+        return len(self.neighborhoods)
+
+    def means(self):
+        # (neighborhood, period, metric) array of means, NaN where a period has no data
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.counts > 0, self.sums / self.counts, np.nan)
+
+    def resample(self, freq):
+        """The same series at the coarser frequency ``freq`` (``'Q'`` or ``'Y'``)."""
+        if FREQUENCIES.index(freq) < FREQUENCIES.index(self.freq):
+            raise ValueError(f"cannot resample {self.freq!r} data to the finer frequency {freq!r}")
+        target = self.periods.asfreq(freq).asi8
+        # The periods are consecutive, so each target period is one run of them
+        starts = np.flatnonzero(np.r_[True, np.diff(target) != 0])
+        periods = pd.period_range(pd.Period(ordinal=target[0], freq=freq), periods=len(starts))
+        return NeighborhoodSeries(
+            self.neighborhoods,
+            periods,
+            self.metrics,
+            np.add.reduceat(self.sums, starts, axis=1),
+            np.add.reduceat(self.counts, starts, axis=1),
+        )
+
+    def rolling(self, window):
+        """Trailing ``window``-period totals, so ``means()`` are rolling means.
+
+        Each period's mean is over the observations of that period and the
+        ``window - 1`` before it, weighted by their counts.
+        """
+        if window < 1:
+            raise ValueError("window must be at least one period")
+
+        def trailing(values):
+            running = np.cumsum(values, axis=1)
+            totals = running.copy()
+            totals[:, window:] -= running[:, :-window]
+            return totals
+
+        return NeighborhoodSeries(
+            self.neighborhoods, self.periods, self.metrics, trailing(self.sums), trailing(self.counts)
+        )
+
+    def city(self):
+        # The series of all neighborhoods together, like the city-wide yearly means
+        return NeighborhoodSeries(
+            ['All'], self.periods, self.metrics,
+            self.sums.sum(axis=0, keepdims=True), self.counts.sum(axis=0, keepdims=True),
+        )
+
+    def to_frame(self):
+        """Long DataFrame of the means of every (period, neighborhood) with data.
+
+        Yearly series are indexed by ``(year, neighborhood)`` with integer
+        years, like ``prices_by_year_by_neighborhood``; others by
+        ``(period, neighborhood)``.
+        """
+        means = self.means().transpose(1, 0, 2).reshape(-1, len(self.metrics))
+        observed = self.counts.transpose(1, 0, 2).reshape(-1, len(self.metrics)).any(axis=1)
+        if self.freq == 'Y':
+            periods = pd.Index(self.periods.year, name='year')
+        else:
+            periods = pd.Index(self.periods, name='period')
+        index = pd.MultiIndex.from_product([periods, self.neighborhoods])
+        return pd.DataFrame(means[observed], index=index[observed], columns=self.metrics)
+
+    def save(self, path):
+        pd.to_pickle({
+            'neighborhoods': self.neighborhoods,
+            'periods': self.periods,
+            'metrics': self.metrics,
+            'sums': self.sums,
+            'counts': self.counts,
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        state = pd.read_pickle(path)
+        return cls(state['neighborhoods'], state['periods'], state['metrics'], state['sums'], state['counts'])
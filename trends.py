@@ -0,0 +1,131 @@
+"""Per-neighborhood trends and an investment-candidate ranking.
+
+The notebook's data story picks neighborhoods with "consistent growth in
+rent/price" by looking at the ``rent_to_price`` plot one neighborhood at a
+time. Here every metric is laid out as a (neighborhood x year) matrix (see
+``year_over_year.metric_matrix``) and all rows are fitted at once:
+
+* a linear trend ``value ~ a + b * year``: ``slope`` and its ``r2``
+* a log-linear trend ``log(value) ~ a + b * year``: ``growth``, the
+  compound annual growth rate ``exp(b) - 1``
+* ``volatility``: the standard deviation of the residuals of the
+  log-linear fit, i.e. the typical yearly deviation from the trend
+
+Missing years are masked out, so each row is an ordinary least-squares fit
+over the years it has. The normal equations of a one-variable fit have a
+closed form, which is evaluated for every row with a handful of array
+reductions instead of one ``lstsq`` call per neighborhood.
+"""
+
+import numpy as np
+import pandas as pd
+
+from aggregates import add_rent_to_price
+from year_over_year import metric_matrix
+
+
+TREND_METRICS = ['rent_to_price', 'gross_rent', 'sale_price_sqr_foot']
+TREND_STATS = ['slope', 'r2', 'growth', 'volatility', 'years']
+
+# Fewer observed years than this leave a neighborhood's trend undefined
+MIN_YEARS = 3
+
+# Weights of the standardized trend statistics in the investment score
+DEFAULT_WEIGHTS = {
+    'rent_to_price_growth': 1.0,
+    'rent_to_price_r2': 0.5,
+    'gross_rent_growth': 0.5,
+    'rent_to_price_volatility': -0.5,
+}
+
+
+def _line_fit(x, values):
+    # Masked OLS of each row of `values` on `x`: slope, intercept, r2 and observation count
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(observed, x, 0).sum(axis=1) / count
+        y_mean = np.where(observed, values, 0).sum(axis=1) / count
+        dx = np.where(observed, x - x_mean[:, None], 0)
+        dy = np.where(observed, values - y_mean[:, None], 0)
+        sxx = (dx * dx).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+        slope = sxy / sxx
+        r2 = np.where(syy > 0, sxy * sxy / (sxx * syy), 1.0)
+    return slope, y_mean - slope * x_mean, r2, count
+
+
+def fit_trends(values, years, min_years=MIN_YEARS):
+    """Trend statistics of every row of a (neighborhood x year) array.
+
+    ``values`` may contain NaN for missing years. Returns a dict of arrays
+    keyed by ``TREND_STATS``; rows with fewer than ``min_years`` observed
+    years get NaN statistics.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = np.asarray(years, dtype=np.float64)[None, :]
+
+    slope, _, r2, count = _line_fit(x, values)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logs = np.log(np.where(values > 0, values, np.nan))
+    log_slope, log_intercept, _, log_count = _line_fit(x, logs)
+    growth = np.expm1(log_slope)
+
+    # Two fitted parameters leave count - 2 degrees of freedom
+    residuals = logs - (log_intercept[:, None] + log_slope[:, None] * x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        squares = np.where(np.isnan(residuals), 0, residuals ** 2).sum(axis=1)
+        volatility = np.sqrt(squares / (log_count - 2))
+
+    short = count < min_years
+    slope[short] = np.nan
+    r2[short] = np.nan
+    growth[log_count < min_years] = np.nan
+    volatility[log_count < min_years] = np.nan
+    return {'slope': slope, 'r2': r2, 'growth': growth, 'volatility': volatility, 'years': count}
+
+
+def trend_table(prices, metrics=TREND_METRICS, min_years=MIN_YEARS):
+    """One row per neighborhood with ``<metric>_<stat>`` trend columns.
+
+    ``prices`` is indexed by ``(year, neighborhood)`` like
+    ``prices_by_year_by_neighborhood``; ``rent_to_price`` is derived if it
+    is missing.
+    """
+    if 'rent_to_price' in metrics and 'rent_to_price' not in prices.columns:
+        prices = add_rent_to_price(prices.copy())
+
+    columns = {}
+    index = None
+    for metric in metrics:
+        values, neighborhoods, years = metric_matrix(prices, metric)
+        index = neighborhoods
+        for stat, column in fit_trends(values, years, min_years).items():
+            columns[f'{metric}_{stat}'] = column
+    return pd.DataFrame(columns, index=index)
+
+
+def investment_candidates(prices, weights=DEFAULT_WEIGHTS, min_years=MIN_YEARS):
+    """Neighborhoods ranked by a weighted score of their standardized trends.
+
+    Each column named in ``weights`` is converted to a z-score across
+    neighborhoods and the weighted z-scores are summed into ``score``.
+    The default favors a steadily rising ``rent_to_price`` with rising
+    rents. Neighborhoods missing any weighted statistic are left out.
+    Returns the ``trend_table`` columns plus ``score`` and ``rank``,
+    best first.
+    """
+    table = trend_table(prices, min_years=min_years)
+    table = table.dropna(subset=list(weights))
+
+    score = np.zeros(len(table))
+    for column, weight in weights.items():
+        values = table[column].to_numpy()
+        spread = values.std()
+        if spread > 0:
+            score += weight * (values - values.mean()) / spread
+    table = table.assign(score=score).sort_values('score', ascending=False, kind='stable')
+    table['rank'] = np.arange(1, len(table) + 1)
+    return table
@@ -0,0 +1,111 @@
+"""Year-over-year changes and drop detection across all neighborhoods.
+
+The notebook answers "did any year see a drop in sale price per square
+foot, and did rent rise that year?" by reading plots, one neighborhood at a
+time. Here each metric is laid out as a (neighborhood x year) matrix and the
+deltas, percentage changes and drop flags of every neighborhood come out of
+one array operation per metric.
+
+Changes are between consecutive calendar years: if a neighborhood has no
+value for a year, the changes into and out of that year are NaN.
+"""
+
+import numpy as np
+import pandas as pd
+
+from aggregates import KEYS, add_rent_to_price
+
+
+CHANGE_METRICS = ['sale_price_sqr_foot', 'gross_rent', 'rent_to_price']
+
+# Label used when the city-wide yearly means are screened like a neighborhood
+CITY = 'San Francisco'
+
+
+def metric_matrix(prices, metric):
+    """``metric`` as a (neighborhood x year) array, with its row and column labels.
+
+    ``prices`` is indexed by ``(year, neighborhood)`` like
+    ``prices_by_year_by_neighborhood``. Missing years of the full calendar
+    range are filled with NaN columns.
+    """
+    wide = prices[metric].unstack('year')
+    years = np.arange(wide.columns.min(), wide.columns.max() + 1)
+    wide = wide.reindex(columns=years)
+    return wide.to_numpy(dtype=np.float64), wide.index, wide.columns
+
+
+def year_over_year(prices, metrics=CHANGE_METRICS):
+    """Long table of year-over-year changes for every neighborhood and metric.
+
+    One row per (neighborhood, year, metric) with the value, the previous
+    year's value, the change, the percentage change and a ``drop`` flag.
+    The first year of the range has no previous year and is omitted.
+    """
+    if 'rent_to_price' in metrics and 'rent_to_price' not in prices.columns:
+        prices = add_rent_to_price(prices.copy())
+
+    tables = []
+    for metric in metrics:
+        values, neighborhoods, years = metric_matrix(prices, metric)
+        current, previous = values[:, 1:], values[:, :-1]
+        change = current - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change = np.where(previous != 0, change / previous * 100, np.nan)
+        tables.append(pd.DataFrame({
+            'neighborhood': np.repeat(neighborhoods.to_numpy(), len(years) - 1),
+            'year': np.tile(years[1:].to_numpy(), len(neighborhoods)),
+            'metric': metric,
+            'value': current.ravel(),
+            'previous': previous.ravel(),
+            'change': change.ravel(),
+            'pct_change': pct_change.ravel(),
+            'drop': (change < 0).ravel(),
+        }))
+    return pd.concat(tables, ignore_index=True)
+
+
+def divergence_events(prices):
+    """Years in which sale price and gross rent moved in opposite directions.
+
+    Returns one row per (neighborhood, year) event with both changes, the
+    change in ``rent_to_price`` and an ``event`` label:
+    ``'price_drop_rent_rise'`` or ``'price_rise_rent_drop'``. The result is
+    a plain DataFrame, so it can be filtered with ``.query()``.
+    """
+    prices = add_rent_to_price(prices[['sale_price_sqr_foot', 'gross_rent']].copy())
+    price, neighborhoods, years = metric_matrix(prices, 'sale_price_sqr_foot')
+    rent, _, _ = metric_matrix(prices, 'gross_rent')
+    ratio, _, _ = metric_matrix(prices, 'rent_to_price')
+
+    price_change = np.diff(price, axis=1)
+    rent_change = np.diff(rent, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_pct = price_change / price[:, :-1] * 100
+        rent_pct = rent_change / rent[:, :-1] * 100
+    price_drop_rent_rise = (price_change < 0) & (rent_change > 0)
+    price_rise_rent_drop = (price_change > 0) & (rent_change < 0)
+
+    rows, columns = np.nonzero(price_drop_rent_rise | price_rise_rent_drop)
+    events = pd.DataFrame({
+        'neighborhood': neighborhoods.to_numpy()[rows],
+        'year': years.to_numpy()[columns + 1],
+        'price_change': price_change[rows, columns],
+        'price_pct_change': price_pct[rows, columns],
+        'rent_change': rent_change[rows, columns],
+        'rent_pct_change': rent_pct[rows, columns],
+        'rent_to_price_change': np.diff(ratio, axis=1)[rows, columns],
+        'event': np.where(
+            price_drop_rent_rise[rows, columns], 'price_drop_rent_rise', 'price_rise_rent_drop'
+        ),
+    })
+    return events.sort_values(['year', 'neighborhood'], ignore_index=True)
+
+
+def city_prices(prices_square_foot_by_year, name=CITY):
+    # Index the city-wide yearly means like a single neighborhood
+    city = prices_square_foot_by_year.copy()
+    city.index = pd.MultiIndex.from_arrays(
+        [city.index, np.full(len(city), name, dtype=object)], names=KEYS
+    )
+    return city